@@ -1,31 +1,103 @@
-from typing import Literal, Tuple, Dict, Optional
+from typing import Callable, Literal, Tuple, Dict, List, Optional, Iterable, Iterator
 import os
+import io
+import zlib
+import difflib
+import csv
+import gzip
+import tempfile
+import atexit
+import re
 import time
 import json
+import heapq
+import math
+import shutil
+import random
+import sqlite3
+import multiprocessing
+import hashlib
 import requests
 import PyPDF2
 from datetime import datetime, timedelta
 import pytz
+import asyncio
+import threading
+import weakref
+import httpx
+import numpy as np
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed, wait)
 
 import streamlit as st
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from agno.agent import Agent
 from agno.tools.email import EmailTools
 from phi.tools.zoom import ZoomTool
 from phi.utils.log import logger
 from streamlit_pdf_viewer import pdf_viewer
 
+from pdf_extraction_worker import extract_pdf_page_range, iter_pdf_pages
+from resume_compression import (CHARS_PER_TOKEN, LOW_VALUE_SECTIONS, PAGE_BREAK, RESUME_TOKEN_BUDGET,
+                                compress_resume_text, estimate_tokens)
+
 # ======================================================================
 # --- OPENROUTER CONFIGURATION ---
 # ======================================================================
 
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
 def setup_openrouter(api_key: str):
     openai.api_key = api_key
-    openai.api_base = "https://openrouter.ai/api/v1"
+    openai.api_base = OPENROUTER_BASE_URL
 
 OR_MODEL = "nousresearch/hermes-4-405b"
 
+# Connection pool limits for the shared OpenRouter clients (env-overridable)
+OR_POOL_MAX_CONNECTIONS = int(os.getenv("OR_POOL_MAX_CONNECTIONS", "20"))
+OR_POOL_MAX_KEEPALIVE = int(os.getenv("OR_POOL_MAX_KEEPALIVE", "10"))
+OR_POOL_KEEPALIVE_EXPIRY = float(os.getenv("OR_POOL_KEEPALIVE_EXPIRY", "120"))
+
+_client_registry: Dict[Tuple[str, str], OpenAI] = {}
+_client_registry_lock = threading.Lock()
+
+def get_openrouter_client(api_key: str, base_url: str = OPENROUTER_BASE_URL) -> OpenAI:
+    """Return the process-wide OpenAI client for (api_key, base_url).
+
+    Clients are created once and reused by every session and thread, so
+    repeat calls ride on already-open keep-alive connections instead of
+    paying a new TCP+TLS handshake.
+    """
+    key = (api_key, base_url)
+    client = _client_registry.get(key)
+    if client is not None:
+        return client
+    with _client_registry_lock:
+        client = _client_registry.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=OR_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=OR_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=OR_POOL_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+            )
+            # Retries are done by call_with_resilience; SDK retries would multiply them
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _client_registry[key] = client
+    return client
+
+def close_openrouter_clients() -> None:
+    """Close every pooled client and empty the registry."""
+    with _client_registry_lock:
+        clients = list(_client_registry.values())
+        _client_registry.clear()
+    for client in clients:
+        client.close()
+
 # ======================================================================
 # --- ROLE REQUIREMENTS ---
 # ======================================================================
@@ -119,6 +191,222 @@ def sanitize_ascii(text: str) -> str:
         return ""
     return text.encode("ascii", errors="ignore").decode("ascii")
 
+# ======================================================================
+# --- OPENROUTER RESILIENCE ---
+# ======================================================================
+
+# Retries with full-jitter exponential backoff on transient errors
+OR_MAX_RETRIES = int(os.getenv("OR_MAX_RETRIES", "3"))
+OR_RETRY_BASE_DELAY = float(os.getenv("OR_RETRY_BASE_DELAY", "0.5"))
+OR_RETRY_MAX_DELAY = float(os.getenv("OR_RETRY_MAX_DELAY", "8"))
+# Hedging: after the p95 latency (never less than the floor) a duplicate request is raced
+OR_HEDGE_REQUESTS = os.getenv("OR_HEDGE_REQUESTS", "0") == "1"
+OR_HEDGE_MIN_DELAY = float(os.getenv("OR_HEDGE_MIN_DELAY", "2"))
+# Delay used until OR_HEDGE_MIN_SAMPLES latencies have been observed
+OR_HEDGE_COLD_DELAY = float(os.getenv("OR_HEDGE_COLD_DELAY", "10"))
+OR_HEDGE_MIN_SAMPLES = 20
+# Threads running sync primaries and hedges: twice the pooled connections, so a hedge
+# never queues behind the primaries (or abandoned losers) of a full batch
+OR_HEDGE_POOL_WORKERS = int(os.getenv("OR_HEDGE_POOL_WORKERS", "0")) or 2 * OR_POOL_MAX_CONNECTIONS
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+OR_BREAKER_FAILURES = int(os.getenv("OR_BREAKER_FAILURES", "5"))
+OR_BREAKER_COOLDOWN = float(os.getenv("OR_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError,
+                        httpx.TransportError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def retry_delay(attempt: int, exc: Optional[BaseException] = None) -> float:
+    """Full-jitter backoff for `attempt` (0-based), stretched to any Retry-After the server sent."""
+    delay = random.uniform(0, min(OR_RETRY_MAX_DELAY, OR_RETRY_BASE_DELAY * (2 ** attempt)))
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), OR_RETRY_MAX_DELAY))
+        except ValueError:
+            pass
+    return delay
+
+class LatencyTracker:
+    """Rolling window of call latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < OR_HEDGE_MIN_SAMPLES:
+                return None
+            return float(np.percentile(self._samples, q))
+
+    def hedge_delay(self) -> float:
+        p95 = self.percentile(95)
+        return max(OR_HEDGE_MIN_DELAY, p95 if p95 is not None else OR_HEDGE_COLD_DELAY)
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = OR_BREAKER_FAILURES, cooldown: float = OR_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"OpenRouter circuit open after {self.failures} consecutive failures; "
+                    f"retry in {max(remaining, 0):.0f}s"
+                )
+            self._probing = True    # let exactly one call through to test the provider
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+_or_latency = LatencyTracker()
+_or_breaker = CircuitBreaker()
+_hedge_pool = ThreadPoolExecutor(max_workers=OR_HEDGE_POOL_WORKERS, thread_name_prefix="or-hedge")
+
+def _call_hedged(call: Callable[[], object]) -> object:
+    primary = _hedge_pool.submit(call)
+    done, _ = wait([primary], timeout=_or_latency.hedge_delay())
+    if done:
+        return primary.result()
+    # The slower request is left to finish in the background; its result is discarded
+    hedge = _hedge_pool.submit(call)
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+def call_with_resilience(call: Callable[[], object], hedge: Optional[bool] = None,
+                         record_latency: bool = True):
+    """Run a provider call with retries, optional hedging and the circuit breaker.
+
+    Non-retryable errors (bad request, auth) are raised at once and do not
+    count against the breaker. Pass record_latency=False for calls, such as
+    stream opens, whose timing is not a full completion; the hedge delay is
+    derived from the recorded latencies.
+    """
+    hedge = OR_HEDGE_REQUESTS if hedge is None else hedge
+    for attempt in range(OR_MAX_RETRIES + 1):
+        _or_breaker.before_call()
+        started = time.perf_counter()
+        try:
+            result = _call_hedged(call) if hedge else call()
+        except Exception as e:
+            if not is_retryable_error(e):
+                _or_breaker.record_success()    # the provider answered; only the request was wrong
+                raise
+            _or_breaker.record_failure()
+            if attempt == OR_MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt, e)
+            logger.warning(f"OpenRouter call failed ({e}); retry {attempt + 1}/{OR_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        if record_latency:
+            _or_latency.record(time.perf_counter() - started)
+        _or_breaker.record_success()
+        return result
+
+async def acall_with_resilience(call: Callable[[], "asyncio.Future"], hedge: Optional[bool] = None):
+    """Async counterpart of call_with_resilience; `call` returns a fresh awaitable each time."""
+    hedge = OR_HEDGE_REQUESTS if hedge is None else hedge
+    for attempt in range(OR_MAX_RETRIES + 1):
+        _or_breaker.before_call()
+        started = time.perf_counter()
+        try:
+            if hedge:
+                result = await _acall_hedged(call)
+            else:
+                result = await call()
+        except Exception as e:
+            if not is_retryable_error(e):
+                _or_breaker.record_success()
+                raise
+            _or_breaker.record_failure()
+            if attempt == OR_MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt, e)
+            logger.warning(f"OpenRouter call failed ({e}); retry {attempt + 1}/{OR_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        _or_latency.record(time.perf_counter() - started)
+        _or_breaker.record_success()
+        return result
+
+async def _acall_hedged(call: Callable[[], "asyncio.Future"]):
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=_or_latency.hedge_delay())
+    if done:
+        return primary.result()
+    pending = {primary, asyncio.ensure_future(call())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+def openrouter_health() -> Dict[str, object]:
+    """Breaker state and latency percentiles, for status displays."""
+    return {
+        "breaker": _or_breaker.state,
+        "consecutive_failures": _or_breaker.failures,
+        "p50": _or_latency.percentile(50),
+        "p95": _or_latency.percentile(95),
+    }
+
 # ======================================================================
 # --- OPENROUTER CHAT HELPER ---
 # ======================================================================
@@ -133,38 +421,180 @@ def sanitize_ascii(text: str) -> str:
         return text
     return text.encode("ascii", errors="ignore").decode("ascii")
 
-def openrouter_chat(messages: list, api_key: str) -> str:
-    """Send chat messages to OpenRouter and return model response."""
-    from openai import OpenAI
+# Headers sent with every OpenRouter request (ASCII only)
+OR_EXTRA_HEADERS = {
+    "HTTP-Referer": "http://localhost",
+    "X-Title": "AI Recruitment System",
+}
 
-    # 1️⃣ sanitize all message contents
+def _sanitize_messages(messages: list) -> list:
     safe_messages = []
     for msg in messages:
         safe_msg = {}
         for k, v in msg.items():
             safe_msg[k] = sanitize_ascii(v) if isinstance(v, str) else v
         safe_messages.append(safe_msg)
+    return safe_messages
 
-    # 2️⃣ sanitize headers & strip anything unsafe
-    safe_headers = {
-        "HTTP-Referer": "http://localhost",
-        "X-Title": "AI Recruitment System",
-    }
+def openrouter_chat(messages: list, api_key: str) -> str:
+    """Send chat messages to OpenRouter and return model response."""
+    # 1️⃣ sanitize all message contents
+    safe_messages = _sanitize_messages(messages)
 
-    # 3️⃣ create client and send safe request
-    client = OpenAI(api_key=sanitize_ascii(api_key), base_url="https://openrouter.ai/api/v1")
+    # 2️⃣ reuse the pooled client and send safe request
+    client = get_openrouter_client(sanitize_ascii(api_key))
 
     try:
-        resp = client.chat.completions.create(
+        resp = call_with_resilience(lambda: client.chat.completions.create(
             model=OR_MODEL,
             messages=safe_messages,
-            extra_headers=safe_headers
-        )
-        # 4️⃣ sanitize response text too, just in case
+            extra_headers=OR_EXTRA_HEADERS
+        ))
+        # 3️⃣ sanitize response text too, just in case
         return sanitize_ascii(resp.choices[0].message.content)
     except Exception as e:
         raise RuntimeError(f"OpenRouter chat request failed: {e}")
 
+def openrouter_chat_stream(messages: list, api_key: str) -> Iterator[str]:
+    """Streaming variant of openrouter_chat: yields text fragments as they arrive."""
+    safe_messages = _sanitize_messages(messages)
+    client = get_openrouter_client(sanitize_ascii(api_key))
+
+    try:
+        # Only opening the stream is retried; a duplicate stream is never hedged, and
+        # time-to-headers is not a completion latency, so it stays out of the hedge p95
+        stream = call_with_resilience(lambda: client.chat.completions.create(
+            model=OR_MODEL,
+            messages=safe_messages,
+            extra_headers=OR_EXTRA_HEADERS,
+            stream=True
+        ), hedge=False, record_latency=False)
+        with stream:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield sanitize_ascii(delta)
+    except Exception as e:
+        raise RuntimeError(f"OpenRouter chat request failed: {e}")
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+def iter_json_string_field(chunks: Iterable[str], field: str, collected: List[str]) -> Iterator[str]:
+    """Yield the decoded value of a top-level string `field` while a JSON reply streams in.
+
+    Every raw chunk is appended to `collected`, so the caller can parse the
+    complete reply once the stream is exhausted.
+    """
+    start_re = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+    buffer = ""
+    pos = None          # index in buffer of the next undecoded value character
+    done = False
+    for chunk in chunks:
+        collected.append(chunk)
+        if done:
+            continue
+        buffer += chunk
+        if pos is None:
+            match = start_re.search(buffer)
+            if match is None:
+                continue
+            pos = match.end()
+        out = []
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                done = True
+                break
+            if char != "\\":
+                out.append(char)
+                pos += 1
+                continue
+            # Escape sequence: wait for the rest of it if the chunk split it
+            if pos + 1 >= len(buffer):
+                break
+            code = buffer[pos + 1]
+            if code == "u":
+                if pos + 6 > len(buffer):
+                    break
+                codepoint = int(buffer[pos + 2:pos + 6], 16)
+                if not 0xD800 <= codepoint <= 0xDFFF:    # drop surrogate halves, like sanitize_ascii would
+                    out.append(chr(codepoint))
+                pos += 6
+            else:
+                out.append(_JSON_ESCAPES.get(code, code))
+                pos += 2
+        if out:
+            yield "".join(out)
+
+# ======================================================================
+# --- ASYNC OPENROUTER CHAT HELPER ---
+# ======================================================================
+
+# Max in-flight async requests per event loop, and per-call timeout (seconds)
+OR_ASYNC_MAX_CONCURRENCY = int(os.getenv("OR_ASYNC_MAX_CONCURRENCY", "16"))
+OR_ASYNC_TIMEOUT = float(os.getenv("OR_ASYNC_TIMEOUT", "120"))
+
+# Async clients and semaphores are bound to the loop that created them,
+# so they are registered per loop and dropped when the loop goes away.
+_async_client_registry: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def get_openrouter_async_client(api_key: str, base_url: str = OPENROUTER_BASE_URL) -> AsyncOpenAI:
+    """Return the pooled AsyncOpenAI client for (api_key, base_url) on the running loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_client_registry.setdefault(loop, {})
+    client = clients.get((api_key, base_url))
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OR_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=OR_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=OR_POOL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        clients[(api_key, base_url)] = client
+    return client
+
+def _get_async_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _async_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(OR_ASYNC_MAX_CONCURRENCY)
+        _async_semaphores[loop] = semaphore
+    return semaphore
+
+async def _with_async_slot(make_call: Callable[[], "asyncio.Future"]):
+    """Run one request while holding a concurrency slot, so hedges and retries are counted too."""
+    async with _get_async_semaphore():
+        return await make_call()
+
+async def openrouter_chat_async(messages: list, api_key: str,
+                                timeout: Optional[float] = None) -> str:
+    """Async counterpart of openrouter_chat.
+
+    At most OR_ASYNC_MAX_CONCURRENCY requests (hedges included) are in flight
+    per event loop; each call, retries and backoff included, is abandoned
+    after `timeout` seconds (OR_ASYNC_TIMEOUT by default).
+    """
+    safe_messages = _sanitize_messages(messages)
+    client = get_openrouter_async_client(sanitize_ascii(api_key))
+
+    try:
+        resp = await asyncio.wait_for(
+            acall_with_resilience(lambda: _with_async_slot(lambda: client.chat.completions.create(
+                model=OR_MODEL,
+                messages=safe_messages,
+                extra_headers=OR_EXTRA_HEADERS
+            ))),
+            timeout=timeout or OR_ASYNC_TIMEOUT,
+        )
+        return sanitize_ascii(resp.choices[0].message.content)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"OpenRouter chat request timed out after {timeout or OR_ASYNC_TIMEOUT}s")
+    except Exception as e:
+        raise RuntimeError(f"OpenRouter chat request failed: {e}")
 
 # ======================================================================
 # --- RESUME ANALYZER ---
@@ -176,15 +606,24 @@ def create_resume_analyzer():
         st.error("Please enter your OpenRouter API key first.")
         return None
 
+    class Msg:
+        def __init__(self, content): self.content = content
+    class Resp:
+        def __init__(self, content): self.messages = [Msg(content)]
+
     class ResumeAnalyzer:
         def run(self, prompt):
             messages = [{"role": "user", "content": sanitize_ascii(prompt)}]
-            result = openrouter_chat(messages, api_key)
-            class Msg:
-                def __init__(self, content): self.content = content
-            class Resp:
-                def __init__(self, content): self.messages = [Msg(content)]
-            return Resp(result)
+            return Resp(openrouter_chat(messages, api_key))
+
+        def stream(self, prompt):
+            """Yield the reply text as it is generated."""
+            messages = [{"role": "user", "content": sanitize_ascii(prompt)}]
+            return openrouter_chat_stream(messages, api_key)
+
+        async def arun(self, prompt):
+            messages = [{"role": "user", "content": sanitize_ascii(prompt)}]
+            return Resp(await openrouter_chat_async(messages, api_key))
     return ResumeAnalyzer()
 
 # ======================================================================
@@ -202,30 +641,334 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-def create_email_agent():
+# ======================================================================
+# --- SMTP CONNECTION POOL ---
+# ======================================================================
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# Gmail drops idle sessions; anything idle longer than this is reopened
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+
+class SMTPConnectionPool:
+    """Authenticated SMTP sessions reused across messages.
+
+    At most `max_size` sessions are open at once. A session that sat idle
+    past `idle_timeout`, or that the server dropped mid-send, is replaced
+    transparently.
+    """
+
+    def __init__(self, username: str, password: str, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 starttls: bool = SMTP_STARTTLS, max_size: int = SMTP_POOL_SIZE,
+                 idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.password:
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout:
+                return server
+            self._close(server)
+        return self._connect()
+
+    def _checkin(self, server: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send_messages(self, messages: Iterable[MIMEMultipart]) -> None:
+        """Send several messages back to back over one session."""
+        with self._slots:
+            server = self._checkout()
+            try:
+                for msg in messages:
+                    try:
+                        server.send_message(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        self._close(server)
+                        server = self._connect()
+                        server.send_message(msg)
+            except Exception:
+                self._close(server)
+                raise
+            self._checkin(server)
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        self.send_messages([msg])
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+_smtp_pools: Dict[Tuple[str, int, str, str], SMTPConnectionPool] = {}
+_smtp_pools_lock = threading.Lock()
+
+def get_smtp_pool(username: str, password: str, host: str = SMTP_HOST,
+                  port: int = SMTP_PORT) -> SMTPConnectionPool:
+    """Return the process-wide SMTP pool for these credentials and server."""
+    key = (host, port, username, password)
+    with _smtp_pools_lock:
+        pool = _smtp_pools.get(key)
+        if pool is None:
+            pool = SMTPConnectionPool(username, password, host=host, port=port)
+            _smtp_pools[key] = pool
+    return pool
+
+@atexit.register
+def close_smtp_pools() -> None:
+    with _smtp_pools_lock:
+        pools = list(_smtp_pools.values())
+        _smtp_pools.clear()
+    for pool in pools:
+        pool.close()
+
+# ======================================================================
+# --- OUTBOUND EMAIL QUEUE ---
+# ======================================================================
+
+EMAIL_SUBJECT = "Update on your job application"
+
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", os.path.join(".cache", "email_outbox.sqlite3"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_BACKOFF_BASE = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE", "5"))
+# Pacing between sends adapts within these bounds (seconds)
+EMAIL_OUTBOX_MIN_INTERVAL = float(os.getenv("EMAIL_OUTBOX_MIN_INTERVAL", "1"))
+EMAIL_OUTBOX_MAX_INTERVAL = float(os.getenv("EMAIL_OUTBOX_MAX_INTERVAL", "120"))
+
+# SMTP replies that mean "slow down" rather than "never"
+SMTP_THROTTLE_CODES = {421, 450, 451, 452, 454}
+
+def build_email_message(sender: str, to_email: str, email_content: str,
+                        subject: str = EMAIL_SUBJECT) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.attach(MIMEText(email_content, "plain", "utf-8"))
+    return msg
+
+class EmailOutbox:
+    """Persistent outbound email queue drained by one background thread.
+
+    Messages survive restarts in SQLite; SMTP passwords are only held in
+    memory, so queued mail for a sender waits until that sender registers
+    again. Sends are paced: the interval doubles on throttling replies and
+    shrinks back on success. Failed sends retry with exponential backoff.
+    """
+
+    def __init__(self, path: str = EMAIL_OUTBOX_PATH, max_attempts: int = EMAIL_OUTBOX_MAX_ATTEMPTS,
+                 backoff_base: float = EMAIL_OUTBOX_BACKOFF_BASE,
+                 min_interval: float = EMAIL_OUTBOX_MIN_INTERVAL,
+                 max_interval: float = EMAIL_OUTBOX_MAX_INTERVAL):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._credentials: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, to_email TEXT NOT NULL,"
+            " subject TEXT NOT NULL, body TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " last_error TEXT, created_at REAL NOT NULL, sent_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_to_email ON outbox(to_email)")
+        self._conn.commit()
+        self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._worker.start()
+
+    def register_sender(self, sender: str, password: str) -> None:
+        with self._lock:
+            self._credentials[sender] = password
+        self._wake.set()
+
+    def enqueue(self, sender: str, to_email: str, body: str, subject: str = EMAIL_SUBJECT) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (sender, to_email, subject, body, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (sender, to_email, subject, body, now, now)
+            )
+            self._conn.commit()
+        self._wake.set()
+        return cur.lastrowid
+
+    def status_by_recipient(self, emails: Iterable[str]) -> Dict[str, Dict]:
+        """Latest delivery status per recipient address."""
+        emails = list(set(emails))
+        if not emails:
+            return {}
+        placeholders = ",".join("?" * len(emails))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT to_email, status, attempts, last_error FROM outbox"
+                f" WHERE id IN (SELECT MAX(id) FROM outbox WHERE to_email IN ({placeholders}) GROUP BY to_email)",
+                emails
+            ).fetchall()
+        return {row[0]: {'status': row[1], 'attempts': row[2], 'last_error': row[3]} for row in rows}
+
+    def _next_due(self) -> Tuple[Optional[tuple], float]:
+        """Return (job, seconds until the next queued job could be due)."""
+        with self._lock:
+            senders = list(self._credentials)
+            if not senders:
+                return None, 5.0
+            placeholders = ",".join("?" * len(senders))
+            row = self._conn.execute(
+                f"SELECT id, sender, to_email, subject, body, attempts, next_attempt_at FROM outbox"
+                f" WHERE status = 'queued' AND sender IN ({placeholders})"
+                f" ORDER BY next_attempt_at, id LIMIT 1", senders
+            ).fetchone()
+        if row is None:
+            return None, 5.0
+        wait = row[6] - time.time()
+        return (row, 0.0) if wait <= 0 else (None, min(wait, 5.0))
+
+    def _run(self) -> None:
+        next_send_at = 0.0
+        while not self._stop.is_set():
+            job, wait = self._next_due()
+            if job is None:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            pause = next_send_at - time.monotonic()
+            if pause > 0:
+                self._stop.wait(pause)
+                continue
+            self._deliver(job)
+            next_send_at = time.monotonic() + self.interval
+
+    def _deliver(self, job: tuple) -> None:
+        job_id, sender, to_email, subject, body, attempts, _ = job
+        with self._lock:
+            password = self._credentials.get(sender, "")
+        try:
+            get_smtp_pool(sender, password).send_message(build_email_message(sender, to_email, body, subject))
+        except Exception as e:
+            attempts += 1
+            code = getattr(e, "smtp_code", None)
+            if code in SMTP_THROTTLE_CODES:
+                self.interval = min(self.max_interval, self.interval * 2)
+            permanent = isinstance(e, smtplib.SMTPRecipientsRefused) or (code is not None and code >= 500)
+            if permanent or attempts >= self.max_attempts:
+                status, next_attempt_at = 'failed', time.time()
+            else:
+                delay = self.backoff_base * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+                status, next_attempt_at = 'queued', time.time() + delay
+            logger.error(f"Email to {to_email} failed (attempt {attempts}): {e}")
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, next_attempt_at, str(e), job_id)
+                )
+                self._conn.commit()
+        else:
+            self.interval = max(self.min_interval, self.interval * 0.8)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                    (attempts + 1, time.time(), job_id)
+                )
+                self._conn.commit()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+_email_outbox: Optional[EmailOutbox] = None
+_email_outbox_lock = threading.Lock()
+
+def get_email_outbox() -> EmailOutbox:
+    """Return the process-wide outbox, starting its worker on first use."""
+    global _email_outbox
+    if _email_outbox is None:
+        with _email_outbox_lock:
+            if _email_outbox is None:
+                _email_outbox = EmailOutbox()
+                atexit.register(_email_outbox.stop)
+    return _email_outbox
+
+def create_email_agent(queued: bool = False):
+    """Create the email agent; with `queued`, deliver() hands mail to the outbox and returns at once."""
     api_key = st.session_state.openai_api_key
     sender = st.session_state.email_sender
     app_password = st.session_state.email_passkey
+    if queued:
+        get_email_outbox().register_sender(sender, app_password)
 
     class EmailAgent:
         def run(self, prompt):
             # Step 1: Let the AI draft the email text
-            messages = [{"role": "user", "content": prompt}]
-            email_content = openrouter_chat(messages, api_key)
+            email_content = self.draft(prompt)
 
             # Step 2: Send the email via SMTP (Gmail)
-            try:
-                msg = MIMEMultipart()
-                msg["From"] = sender
-                msg["To"] = extract_email(prompt)
-                msg["Subject"] = "Update on your job application"
+            self.deliver(extract_email(prompt), email_content)
+            return email_content
+
+        def draft(self, prompt):
+            """Draft the email text without sending it."""
+            messages = [{"role": "user", "content": prompt}]
+            return openrouter_chat(messages, api_key)
+
+        def draft_stream(self, prompt):
+            """Like draft(), but yield the text as it is generated."""
+            messages = [{"role": "user", "content": prompt}]
+            return openrouter_chat_stream(messages, api_key)
+
+        async def arun(self, prompt):
+            messages = [{"role": "user", "content": prompt}]
+            email_content = await openrouter_chat_async(messages, api_key)
+            # smtplib is blocking; keep it off the event loop
+            await asyncio.to_thread(self.deliver, extract_email(prompt), email_content)
+            return email_content
 
-                msg.attach(MIMEText(email_content, "plain", "utf-8"))
+        def deliver(self, to_email, email_content):
+            if queued:
+                return get_email_outbox().enqueue(sender, to_email, email_content)
+            try:
+                msg = build_email_message(sender, to_email, email_content)
 
-                with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                    server.starttls()
-                    server.login(sender, app_password)
-                    server.send_message(msg)
+                get_smtp_pool(sender, app_password).send_message(msg)
 
                 st.success(f"✅ Email sent to {msg['To']}")
                 print(f"✅ Email sent successfully to {msg['To']}")
@@ -233,8 +976,6 @@ def create_email_agent():
                 st.error(f"❌ Failed to send email: {e}")
                 print(f"❌ Email send error: {e}")
 
-            return email_content
-
     # helper to extract email address from the prompt text
     def extract_email(prompt_text):
         import re
@@ -258,33 +999,430 @@ def create_scheduler_agent():
         def run(self, prompt):
             messages = [{"role": "user", "content": sanitize_ascii(prompt)}]
             return openrouter_chat(messages, api_key)
+
+        async def arun(self, prompt):
+            messages = [{"role": "user", "content": sanitize_ascii(prompt)}]
+            return await openrouter_chat_async(messages, api_key)
     return SchedulerAgent()
 
 # ======================================================================
 # --- PDF TEXT EXTRACTION ---
 # ======================================================================
 
-def extract_text_from_pdf(pdf_file) -> str:
+# Cut-offs for very long documents (multi-hundred-page CV portfolios)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "100"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "200000"))
+
+# iter_pdf_pages lives in pdf_extraction_worker so pool children can use it too
+
+def _log_pdf_page(index: int, text: str, elapsed: float) -> None:
+    logger.debug(f"Extracted PDF page {index + 1} ({len(text)} chars) in {elapsed * 1000:.1f} ms")
+
+def extract_text_from_pdf(pdf_file, max_pages: Optional[int] = PDF_MAX_PAGES,
+                          max_chars: Optional[int] = PDF_MAX_CHARS) -> str:
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
+        pages = []
+        for index, text, elapsed in iter_pdf_pages(pdf_file, max_pages, max_chars):
+            _log_pdf_page(index, text, elapsed)
+            pages.append(text)
+        return PAGE_BREAK.join(pages)
     except Exception as e:
         st.error(f"Error extracting PDF text: {str(e)}")
         return ""
 
 # ======================================================================
-# --- RESUME ANALYSIS ---
+# --- PROCESS-POOL PDF EXTRACTION ---
 # ======================================================================
 
-def analyze_resume(resume_text: str,
-                   role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
-                   analyzer) -> Tuple[bool, str]:
+# PyPDF2 is pure Python and holds the GIL, so parsing is spread over processes
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "0")) or (os.cpu_count() or 1)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+def _pdf_pool_context() -> multiprocessing.context.BaseContext:
+    """Start pool children without forking the app's threads and locks.
+
+    forkserver where available (children are forked from a clean server that
+    has only preloaded the worker module), spawn elsewhere.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_extraction_worker"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+class PDFExtractionService:
+    """Process pool that extracts PDF text, splitting big documents into page ranges.
+
+    With `inline` (single uploads), a document of at most `pages_per_task`
+    pages is parsed in the calling thread, where a pool round trip costs more
+    than it saves. Bulk callers pass inline=False so every document goes to
+    the pool and parsing uses all cores.
+    """
+
+    def __init__(self, max_workers: int = PDF_EXTRACTION_WORKERS,
+                 pages_per_task: int = PDF_PAGES_PER_TASK):
+        self.pages_per_task = max(1, pages_per_task)
+        self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pdf_pool_context())
+
+    def extract(self, pdf_bytes: bytes, max_pages: Optional[int] = PDF_MAX_PAGES,
+                max_chars: Optional[int] = PDF_MAX_CHARS, inline: bool = True) -> str:
+        num_pages = len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+        if max_pages is not None:
+            num_pages = min(num_pages, max_pages)
+        futures: List[Future] = []
+        if inline and num_pages <= self.pages_per_task:
+            page_results = [iter_pdf_pages(io.BytesIO(pdf_bytes), max_chars=max_chars, stop=num_pages)]
+        else:
+            # Each range stops at the whole budget; ranges past the cut-off are cancelled below
+            futures = [self._pool.submit(extract_pdf_page_range, pdf_bytes, start,
+                                         min(start + self.pages_per_task, num_pages), max_chars)
+                       for start in range(0, num_pages, self.pages_per_task)]
+            page_results = (future.result() for future in futures)
+        pages: List[str] = []
+        remaining = max_chars
+        for page_result in page_results:
+            for index, text, elapsed in page_result:
+                _log_pdf_page(index, text, elapsed)
+                if remaining is not None:
+                    text = text[:remaining]
+                    remaining -= len(text)
+                pages.append(text)
+                if remaining == 0:
+                    break
+            if remaining == 0:
+                break
+        for future in futures:
+            future.cancel()
+        return PAGE_BREAK.join(pages)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+_pdf_extraction_service: Optional[PDFExtractionService] = None
+_pdf_extraction_service_lock = threading.Lock()
+
+def get_pdf_extraction_service() -> PDFExtractionService:
+    """Return the process-wide extraction service, starting the pool on first use."""
+    global _pdf_extraction_service
+    if _pdf_extraction_service is None:
+        with _pdf_extraction_service_lock:
+            if _pdf_extraction_service is None:
+                _pdf_extraction_service = PDFExtractionService()
+                atexit.register(_pdf_extraction_service.shutdown)
+    return _pdf_extraction_service
+
+# ======================================================================
+# --- PDF TEXT CACHE ---
+# ======================================================================
+
+PDF_TEXT_CACHE_MAX_ENTRIES = int(os.getenv("PDF_TEXT_CACHE_MAX_ENTRIES", "256"))
+
+_pdf_text_cache: "OrderedDict[str, str]" = OrderedDict()
+_pdf_text_cache_lock = threading.Lock()
+
+def extract_text_from_pdf_bytes(pdf_bytes: bytes, inline: bool = True) -> str:
+    """Extract PDF text once per distinct file, keyed by the SHA-256 of its bytes.
+
+    The LRU is process-wide, so reruns and other sessions that upload the
+    same PDF skip PyPDF2 entirely. Failed extractions are not cached. Bulk
+    callers pass inline=False to keep parsing in the process pool.
+    """
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    with _pdf_text_cache_lock:
+        text = _pdf_text_cache.get(digest)
+        if text is not None:
+            _pdf_text_cache.move_to_end(digest)
+            return text
     try:
-        response = analyzer.run(
-            f"""Please analyze this resume against the following requirements and provide your response in valid JSON:
+        text = get_pdf_extraction_service().extract(pdf_bytes, inline=inline)
+    except Exception as e:
+        # Unreadable PDF or broken pool: parse in-process, which reports the error
+        logger.error(f"Process-pool PDF extraction failed: {e}")
+        text = extract_text_from_pdf(io.BytesIO(pdf_bytes))
+    if text:
+        with _pdf_text_cache_lock:
+            _pdf_text_cache[digest] = text
+            _pdf_text_cache.move_to_end(digest)
+            while len(_pdf_text_cache) > PDF_TEXT_CACHE_MAX_ENTRIES:
+                _pdf_text_cache.popitem(last=False)
+    return text
+
+# ======================================================================
+# --- ANALYSIS RESULT CACHE ---
+# ======================================================================
+
+# Bump whenever build_analysis_prompt changes so stale verdicts are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(".cache", "resume_analysis.sqlite3"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+
+def normalize_resume_text(text: str) -> str:
+    """Collapse whitespace so re-extracted copies of the same resume hash alike."""
+    return " ".join((text or "").split())
+
+def analysis_cache_key(resume_text: str, role: str) -> str:
+    digest = hashlib.sha256()
+    for part in (normalize_resume_text(resume_text), ROLE_REQUIREMENTS[role].strip(),
+                 OR_MODEL, ANALYSIS_PROMPT_VERSION, str(RESUME_TOKEN_BUDGET)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """SQLite-backed cache of parsed analysis results with TTL and LRU eviction."""
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, ttl: float = ANALYSIS_CACHE_TTL,
+                 max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache(last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now)
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM analysis_cache WHERE key IN "
+                    "(SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': size}
+
+_analysis_cache: Optional[AnalysisCache] = None
+_analysis_cache_lock = threading.Lock()
+
+def get_analysis_cache() -> AnalysisCache:
+    """Return the process-wide analysis cache, opening it on first use."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache()
+    return _analysis_cache
+
+# ======================================================================
+# --- LOCAL SKILL MATCHER ---
+# ======================================================================
+
+# Coverage below this fraction of a role's required skills is rejected
+# locally without calling the model. 0 disables the pre-screen.
+SKILL_PRESCREEN_THRESHOLD = float(os.getenv("SKILL_PRESCREEN_THRESHOLD", "0.2"))
+
+# Extra spellings for requirement items, keyed by the lower-cased item text
+# as it appears in ROLE_REQUIREMENTS. Items not listed here still match on
+# their own text and on "/" or parenthesised alternatives.
+SKILL_SYNONYMS: Dict[str, List[str]] = {
+    "pytorch/tensorflow": ["pytorch", "tensorflow", "keras", "jax"],
+    "machine learning algorithms and frameworks": ["machine learning", "scikit-learn", "sklearn",
+                                                   "xgboost", "lightgbm"],
+    "deep learning and neural networks": ["deep learning", "neural network", "neural networks",
+                                          "cnn", "rnn", "lstm", "transformers"],
+    "data preprocessing and analysis": ["data preprocessing", "data analysis", "data cleaning",
+                                        "feature engineering", "pandas", "numpy"],
+    "mlops and model deployment": ["mlops", "model deployment", "model serving", "mlflow",
+                                   "kubeflow", "sagemaker"],
+    "rag": ["retrieval augmented generation", "retrieval-augmented generation"],
+    "llm": ["llms", "large language model", "large language models", "gpt"],
+    "finetuning and prompt engineering": ["finetuning", "fine-tuning", "fine tuning", "lora",
+                                          "prompt engineering"],
+    "react/vue.js/angular": ["react", "react.js", "reactjs", "vue", "vue.js", "vuejs", "angular"],
+    "html5": ["html"],
+    "css3": ["css", "sass", "scss", "tailwind"],
+    "javascript/typescript": ["javascript", "typescript"],
+    "responsive design": ["responsive web design", "responsive ui", "mobile-first", "media queries"],
+    "state management": ["redux", "vuex", "pinia", "mobx", "zustand", "ngrx"],
+    "frontend testing": ["jest", "cypress", "playwright", "vitest", "testing library", "karma"],
+    "python/java/node.js": ["python", "java", "node.js", "nodejs"],
+    "rest apis": ["restful", "rest api", "api design", "fastapi", "flask", "django",
+                  "spring boot", "express.js"],
+    "database design and management": ["database", "databases", "sql", "postgresql", "postgres",
+                                       "mysql", "mongodb", "redis"],
+    "system architecture": ["system design", "software architecture", "microservices",
+                            "distributed systems"],
+    "cloud services (aws/gcp/azure)": ["aws", "gcp", "google cloud", "azure"],
+    "kubernetes": ["k8s", "helm"],
+    "ci/cd": ["continuous integration", "jenkins", "github actions", "gitlab ci", "circleci"],
+}
+
+def parse_role_skills(requirements: str) -> List[Tuple[str, List[str]]]:
+    """Split a requirements block into (skill, aliases) pairs.
+
+    Each comma-separated item on a "- " bullet line is one skill; its aliases
+    are the item itself, its "/" and "(...)" alternatives and SKILL_SYNONYMS.
+    """
+    skills: List[Tuple[str, List[str]]] = []
+    for line in requirements.splitlines():
+        line = line.strip()
+        if not line.startswith("-"):
+            continue
+        for item in re.split(r",(?![^(]*\))", line[1:]):
+            item = item.strip()
+            if not item:
+                continue
+            key = item.lower()
+            aliases = [key]
+            inner = re.search(r"\(([^)]*)\)", key)
+            if inner:
+                aliases.append(key[:inner.start()].strip())
+                aliases.extend(inner.group(1).split("/"))
+            elif "/" in key and all(len(p.strip()) > 2 for p in key.split("/")):
+                aliases.extend(key.split("/"))
+            aliases.extend(SKILL_SYNONYMS.get(key, []))
+            aliases = list(dict.fromkeys(a.strip() for a in aliases if a.strip()))
+            skills.append((item, aliases))
+    return skills
+
+class SkillMatcher:
+    """Single-pass matcher for one role's required skills.
+
+    All aliases are compiled into one alternation regex (longest first) so a
+    resume is scanned once regardless of how many skills the role lists.
+    """
+
+    def __init__(self, requirements: str):
+        parsed = parse_role_skills(requirements)
+        self.skills: List[str] = [skill for skill, _ in parsed]
+        self._alias_to_skills: Dict[str, List[int]] = {}
+        for idx, (_, aliases) in enumerate(parsed):
+            for alias in aliases:
+                self._alias_to_skills.setdefault(alias, []).append(idx)
+        alternation = "|".join(re.escape(a) for a in
+                               sorted(self._alias_to_skills, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<![\w+#])(?:{alternation})(?![\w+#])", re.IGNORECASE)
+
+    def hits(self, text: str) -> set:
+        """Indexes into `skills` of every skill mentioned in `text`."""
+        found = set()
+        for m in self._pattern.finditer(text or ""):
+            found.update(self._alias_to_skills.get(m.group(0).lower(), ()))
+            if len(found) == len(self.skills):
+                break
+        return found
+
+    def match(self, resume_text: str) -> Dict:
+        found = self.hits(resume_text)
+        return {
+            'matching_skills': [s for i, s in enumerate(self.skills) if i in found],
+            'missing_skills': [s for i, s in enumerate(self.skills) if i not in found],
+            'coverage': len(found) / len(self.skills) if self.skills else 1.0,
+        }
+
+_skill_matchers: Dict[str, SkillMatcher] = {}
+_skill_matchers_lock = threading.Lock()
+
+def get_skill_matcher(role: str) -> SkillMatcher:
+    """Return the compiled matcher for `role`, building it on first use."""
+    matcher = _skill_matchers.get(role)
+    if matcher is None:
+        with _skill_matchers_lock:
+            matcher = _skill_matchers.get(role)
+            if matcher is None:
+                matcher = _skill_matchers[role] = SkillMatcher(ROLE_REQUIREMENTS[role])
+    return matcher
+
+def prescreen_resume(resume_text: str, role: str,
+                     threshold: Optional[float] = None) -> Optional[Dict]:
+    """Return a local rejection result when skill coverage is clearly too low.
+
+    Returns None when the resume should go on to the model.
+    """
+    threshold = SKILL_PRESCREEN_THRESHOLD if threshold is None else threshold
+    if threshold <= 0:
+        return None
+    match = get_skill_matcher(role).match(resume_text)
+    if match['coverage'] >= threshold:
+        return None
+    missing = ", ".join(match['missing_skills'])
+    return {
+        'selected': False,
+        'feedback': (f"The resume covers {match['coverage']:.0%} of the required skills for this "
+                     f"role, below the {threshold:.0%} screening threshold. Missing: {missing}."),
+        'matching_skills': match['matching_skills'],
+        'missing_skills': match['missing_skills'],
+        'experience_level': None,
+        'prescreened': True,
+    }
+
+# ======================================================================
+# --- RESUME COMPRESSION ---
+# ======================================================================
+
+_compression_totals: Counter = Counter()
+_compression_totals_lock = threading.Lock()
+
+def prepare_resume_for_prompt(resume_text: str) -> Tuple[str, Dict[str, int]]:
+    """Compress a resume for one model call, logging and tallying the tokens saved."""
+    compressed, report = compress_resume_text(resume_text)
+    with _compression_totals_lock:
+        _compression_totals['calls'] += 1
+        _compression_totals.update(report)
+    logger.info(f"Resume prompt: {report['original_tokens']} -> {report['compressed_tokens']} tokens "
+                f"({report['tokens_saved']} saved)")
+    return compressed, report
+
+def compression_stats() -> Dict[str, int]:
+    """Totals across all prompts compressed by this process."""
+    with _compression_totals_lock:
+        return dict(_compression_totals)
+
+# ======================================================================
+# --- RESUME ANALYSIS ---
+# ======================================================================
+
+def build_analysis_prompt(resume_text: str, role: str) -> str:
+    return f"""Please analyze this resume against the following requirements and provide your response in valid JSON:
             Role Requirements:
             {ROLE_REQUIREMENTS[role]}
             Resume Text:
@@ -303,49 +1441,375 @@ def analyze_resume(resume_text: str,
             - Value projects & adaptability
             Return ONLY JSON without markdown or backticks.
             """
+
+def parse_analysis_response(assistant_message: str) -> Dict:
+    result = json.loads(assistant_message.strip())
+    if not isinstance(result, dict) or not all(k in result for k in ["selected", "feedback"]):
+        raise ValueError("Invalid response format")
+    return normalize_analysis_result(result)
+
+def normalize_analysis_result(result: Dict) -> Dict:
+    """Give the optional analysis fields a predictable shape; they are stored on the candidate."""
+    for key in ("matching_skills", "missing_skills"):
+        skills = result.get(key)
+        result[key] = [str(s).strip() for s in skills if str(s).strip()] if isinstance(skills, list) else []
+    level = result.get("experience_level")
+    result["experience_level"] = str(level).strip().lower() if level else None
+    return result
+
+def _analysis_error(e: Exception) -> Dict:
+    """Placeholder verdict for an unusable model response; `error` tells it apart from a rejection."""
+    return {"selected": False, "feedback": f"Error analyzing resume: {str(e)}",
+            "matching_skills": [], "missing_skills": [], "experience_level": None, "error": str(e)}
+
+def analyze_resume_full(resume_text: str,
+                        role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+                        analyzer, prescreen_threshold: Optional[float] = None) -> Dict:
+    """Analyze a resume and return the whole parsed result.
+
+    Keys: selected, feedback, matching_skills, missing_skills and
+    experience_level, plus `prescreened` when the local matcher decided,
+    `compression` (the token report) when the model was called and `error`
+    when its response could not be parsed. Safe to call from worker threads.
+    """
+    screened = prescreen_resume(resume_text, role, prescreen_threshold)
+    if screened is not None:
+        return screened
+    cache = get_analysis_cache()
+    cache_key = analysis_cache_key(resume_text, role)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return normalize_analysis_result(cached)
+    try:
+        compressed, report = prepare_resume_for_prompt(resume_text)
+        response = analyzer.run(build_analysis_prompt(compressed, role))
+        result = parse_analysis_response(response.messages[0].content)
+        cache.put(cache_key, result)
+        return {**result, "compression": report}
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error processing response: {str(e)}")
+        return _analysis_error(e)
+
+class AnalysisStream:
+    """Streaming form of analyze_resume_full.
+
+    Iterating yields the feedback text as the model writes it (all at once
+    for pre-screened or cached results), so it can be passed straight to
+    st.write_stream. Once exhausted, `result` holds the same dict
+    analyze_resume_full would have returned. `analyzer` must provide `stream`.
+    """
+
+    def __init__(self, resume_text: str, role: str, analyzer, prescreen_threshold: Optional[float] = None):
+        self.resume_text = resume_text
+        self.role = role
+        self.analyzer = analyzer
+        self.prescreen_threshold = prescreen_threshold
+        self.result: Optional[Dict] = None
+
+    def __iter__(self) -> Iterator[str]:
+        result = prescreen_resume(self.resume_text, self.role, self.prescreen_threshold)
+        cache = get_analysis_cache()
+        cache_key = analysis_cache_key(self.resume_text, self.role)
+        if result is None:
+            cached = cache.get(cache_key)
+            result = normalize_analysis_result(cached) if cached is not None else None
+        if result is not None:
+            self.result = result
+            yield result["feedback"]
+            return
+        compressed, report = prepare_resume_for_prompt(self.resume_text)
+        collected: List[str] = []
+        yield from iter_json_string_field(
+            self.analyzer.stream(build_analysis_prompt(compressed, self.role)), "feedback", collected
         )
-        assistant_message = response.messages[0].content
-        result = json.loads(assistant_message.strip())
+        try:
+            result = parse_analysis_response("".join(collected))
+            cache.put(cache_key, result)
+            self.result = {**result, "compression": report}
+        except (json.JSONDecodeError, ValueError) as e:
+            st.error(f"Error processing response: {str(e)}")
+            self.result = _analysis_error(e)
+
+def analyze_resume(resume_text: str,
+                   role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+                   analyzer, prescreen_threshold: Optional[float] = None) -> Tuple[bool, str]:
+    result = analyze_resume_full(resume_text, role, analyzer, prescreen_threshold)
+    if result.get("error"):
+        st.error(f"Error processing response: {result['error']}")
+    return result["selected"], result["feedback"]
+
+async def analyze_resume_full_async(resume_text: str,
+                                    role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+                                    analyzer, prescreen_threshold: Optional[float] = None) -> Dict:
+    """Async variant of analyze_resume_full; `analyzer` must provide `arun`."""
+    screened = prescreen_resume(resume_text, role, prescreen_threshold)
+    if screened is not None:
+        return screened
+    cache = get_analysis_cache()
+    cache_key = analysis_cache_key(resume_text, role)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return normalize_analysis_result(cached)
+    try:
+        compressed, report = prepare_resume_for_prompt(resume_text)
+        response = await analyzer.arun(build_analysis_prompt(compressed, role))
+        result = parse_analysis_response(response.messages[0].content)
+        cache.put(cache_key, result)
+        return {**result, "compression": report}
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error processing response: {str(e)}")
+        return _analysis_error(e)
+
+async def analyze_resume_async(resume_text: str,
+                               role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+                               analyzer, prescreen_threshold: Optional[float] = None) -> Tuple[bool, str]:
+    """Async variant of analyze_resume; `analyzer` must provide `arun`."""
+    result = await analyze_resume_full_async(resume_text, role, analyzer, prescreen_threshold)
+    return result["selected"], result["feedback"]
+
+# ======================================================================
+# --- MULTI-ROLE ANALYSIS ---
+# ======================================================================
+
+def build_multi_role_prompt(resume_text: str, roles: List[str]) -> str:
+    requirements = "\n".join(f"            [{role}]{ROLE_REQUIREMENTS[role]}" for role in roles)
+    example = ",\n".join(
+        f"""                    "{role}": {{"selected": true/false, "fit_score": 0-100, "feedback": "...", """
+        f""""matching_skills": ["..."], "missing_skills": ["..."], "experience_level": "junior/mid/senior"}}"""
+        for role in roles
+    )
+    return f"""Please analyze this resume against each of the following roles and provide your response in valid JSON:
+            Role Requirements:
+{requirements}
+            Resume Text:
+            {resume_text}
+            Your response must be JSON like:
+            {{
+                "roles": {{
+{example}
+                }}
+            }}
+            Criteria (judge each role independently):
+            - Match ≥70% of skills
+            - Consider theory + practice
+            - Value projects & adaptability
+            Return ONLY JSON without markdown or backticks.
+            """
+
+def parse_multi_role_response(assistant_message: str, roles: List[str]) -> Dict[str, Dict]:
+    payload = json.loads(assistant_message.strip())
+    per_role = payload.get("roles", payload) if isinstance(payload, dict) else None
+    if not isinstance(per_role, dict):
+        raise ValueError("Invalid response format")
+    results = {}
+    for role in roles:
+        result = per_role.get(role)
         if not isinstance(result, dict) or not all(k in result for k in ["selected", "feedback"]):
-            raise ValueError("Invalid response format")
-        return result["selected"], result["feedback"]
+            raise ValueError(f"Invalid response format for role {role}")
+        try:
+            result["fit_score"] = max(0.0, min(100.0, float(result.get("fit_score"))))
+        except (TypeError, ValueError):
+            result["fit_score"] = None
+        results[role] = normalize_analysis_result(result)
+    return results
+
+def _plan_multi_role(resume_text: str, roles: Optional[List[str]],
+                     prescreen_threshold: Optional[float]) -> Tuple[Dict[str, Dict], List[str]]:
+    """Answer what the pre-screen and cache can; return (results, roles still needing the model)."""
+    cache = get_analysis_cache()
+    results: Dict[str, Dict] = {}
+    pending = []
+    for role in roles or list(ROLE_REQUIREMENTS):
+        screened = prescreen_resume(resume_text, role, prescreen_threshold)
+        cached = cache.get(analysis_cache_key(resume_text, role)) if screened is None else None
+        if screened is not None:
+            results[role] = screened
+        elif cached is not None:
+            results[role] = normalize_analysis_result(cached)
+        else:
+            pending.append(role)
+    return results, pending
+
+def _finish_multi_role(resume_text: str, results: Dict[str, Dict], pending: List[str],
+                       content: str, report: Dict[str, int]) -> Dict[str, Dict]:
+    cache = get_analysis_cache()
+    for role, result in parse_multi_role_response(content, pending).items():
+        # Cached per role, so a later single-role analysis of this resume reuses it
+        cache.put(analysis_cache_key(resume_text, role), result)
+        results[role] = {**result, "compression": report}
+    return results
+
+def analyze_resume_multi(resume_text: str, analyzer, roles: Optional[List[str]] = None,
+                         prescreen_threshold: Optional[float] = None) -> Dict[str, Dict]:
+    """Analyze one resume against several roles (all by default) with at most one model call.
+
+    Returns role -> result in the analyze_resume_full shape; model verdicts
+    also carry a `fit_score` (0-100, None if the model omitted it).
+    """
+    results, pending = _plan_multi_role(resume_text, roles, prescreen_threshold)
+    if not pending:
+        return results
+    try:
+        compressed, report = prepare_resume_for_prompt(resume_text)
+        response = analyzer.run(build_multi_role_prompt(compressed, pending))
+        return _finish_multi_role(resume_text, results, pending, response.messages[0].content, report)
     except (json.JSONDecodeError, ValueError) as e:
         st.error(f"Error processing response: {str(e)}")
-        return False, f"Error analyzing resume: {str(e)}"
+        return {**results, **{role: _analysis_error(e) for role in pending}}
+
+async def analyze_resume_multi_async(resume_text: str, analyzer, roles: Optional[List[str]] = None,
+                                     prescreen_threshold: Optional[float] = None) -> Dict[str, Dict]:
+    """Async variant of analyze_resume_multi; `analyzer` must provide `arun`."""
+    results, pending = _plan_multi_role(resume_text, roles, prescreen_threshold)
+    if not pending:
+        return results
+    try:
+        compressed, report = prepare_resume_for_prompt(resume_text)
+        response = await analyzer.arun(build_multi_role_prompt(compressed, pending))
+        return _finish_multi_role(resume_text, results, pending, response.messages[0].content, report)
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error processing response: {str(e)}")
+        return {**results, **{role: _analysis_error(e) for role in pending}}
+
+# ======================================================================
+# --- BATCH RESUME ANALYSIS ---
+# ======================================================================
+
+BATCH_MAX_WORKERS = 8
+
+def extract_email_address(text: str) -> str:
+    """Return the first email address found in text, or an empty string."""
+    match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text or "")
+    return match.group(0) if match else ""
+
+def analyze_resume_batch(resumes: Iterable[Tuple[str, bytes]],
+                         role: Literal["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+                         analyzer, max_workers: int = 4,
+                         reuse_duplicates: bool = False) -> Iterator[Dict]:
+    """Extract and analyze many PDF resumes on a bounded thread pool.
+
+    `resumes` yields (label, pdf_bytes) pairs. Results are yielded as each
+    resume finishes, not in submission order, so callers can stream them.
+    Worker threads never touch st.session_state; the analyzer must be
+    created on the script thread beforehand. With `reuse_duplicates`, a
+    near-duplicate of a resume already screened for `role` takes over that
+    verdict (`reused_from` is set) instead of calling the model.
+    """
+    def _process(label: str, pdf_bytes: bytes) -> Dict:
+        started = time.perf_counter()
+        # Batch threads would serialize on the GIL; send every document to the process pool
+        resume_text = extract_text_from_pdf_bytes(pdf_bytes, inline=False)
+        if not resume_text:
+            raise ValueError("No text could be extracted from PDF")
+        duplicates = find_duplicate_candidates(resume_text, role) if reuse_duplicates else []
+        if duplicates:
+            previous = duplicates[0][0]
+            analysis = {
+                'selected': previous.status == 'selected',
+                'feedback': previous.feedback,
+                'matching_skills': previous.get('matching_skills', []),
+                'missing_skills': previous.get('missing_skills', []),
+                'experience_level': previous.experience_level,
+            }
+        else:
+            analysis = analyze_resume_full(resume_text, role, analyzer)
+            if analysis.get('error'):
+                # An unparseable response is a failure, not a rejection to be saved
+                raise ValueError(analysis['error'])
+        return {
+            'label': label,
+            'resume_text': resume_text,
+            'selected': analysis['selected'],
+            'feedback': analysis['feedback'],
+            'matching_skills': analysis.get('matching_skills', []),
+            'missing_skills': analysis.get('missing_skills', []),
+            'experience_level': analysis.get('experience_level'),
+            'reused_from': duplicates[0][0].id if duplicates else None,
+            'elapsed': time.perf_counter() - started,
+        }
+
+    max_workers = max(1, min(max_workers, BATCH_MAX_WORKERS))
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resume-batch")
+    try:
+        futures = {pool.submit(_process, label, data): label for label, data in resumes}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                result['error'] = None
+            except Exception as e:
+                logger.error(f"Batch analysis failed for {futures[future]}: {e}")
+                result = {'label': futures[future], 'error': str(e)}
+            yield result
+    finally:
+        # A caller that stops iterating early (or a Streamlit rerun) must not wait for queued resumes
+        pool.shutdown(wait=False, cancel_futures=True)
 
 # ======================================================================
 # --- EMAIL FUNCTIONS ---
 # ======================================================================
 
-def send_selection_email(email_agent, to_email: str, role: str) -> None:
-    email_agent.run(
-        f"""
+def selection_email_prompt(to_email: str, role: str) -> str:
+    return f"""
         Send an email to {to_email} about selection for the {role} position.
         Congratulate them and mention next steps.
         Include company name: {st.session_state.company_name}.
         """
-    )
 
-def send_rejection_email(email_agent, to_email: str, role: str, feedback: str) -> None:
+def rejection_email_prompt(to_email: str, role: str, feedback: str,
+                           missing_skills: Optional[List[str]] = None) -> str:
     safe_feedback = sanitize_ascii(feedback)
-    email_agent.run(
-        f"""
+    skills = sanitize_ascii(", ".join(missing_skills)) if missing_skills else "those implied by the feedback"
+    return f"""
         send an email to {to_email} regarding the {role} application.
         Use all lowercase, be empathetic and human.
         Mention feedback: {safe_feedback}
         Encourage upskilling and retry.
-        Suggest learning resources based on missing skills.
+        Suggest learning resources for these missing skills: {skills}
         End with exactly:
         best,
         the ai recruiting team
         """
-    )
+
+def send_selection_email(email_agent, to_email: str, role: str, draft: Optional[str] = None) -> None:
+    """Send a selection email; an already-previewed `draft` is sent verbatim."""
+    if draft is not None:
+        email_agent.deliver(to_email, draft)
+    else:
+        email_agent.run(selection_email_prompt(to_email, role))
+
+def send_rejection_email(email_agent, to_email: str, role: str, feedback: str,
+                         draft: Optional[str] = None, missing_skills: Optional[List[str]] = None) -> None:
+    """Send a rejection email; an already-previewed `draft` is sent verbatim."""
+    if draft is not None:
+        email_agent.deliver(to_email, draft)
+    else:
+        email_agent.run(rejection_email_prompt(to_email, role, feedback, missing_skills))
+
+async def send_selection_email_async(email_agent, to_email: str, role: str,
+                                     draft: Optional[str] = None) -> None:
+    if draft is not None:
+        await asyncio.to_thread(email_agent.deliver, to_email, draft)
+    else:
+        await email_agent.arun(selection_email_prompt(to_email, role))
+
+async def send_rejection_email_async(email_agent, to_email: str, role: str, feedback: str,
+                                     draft: Optional[str] = None,
+                                     missing_skills: Optional[List[str]] = None) -> None:
+    if draft is not None:
+        await asyncio.to_thread(email_agent.deliver, to_email, draft)
+    else:
+        await email_agent.arun(rejection_email_prompt(to_email, role, feedback, missing_skills))
 
 # ======================================================================
 # --- INTERVIEW SCHEDULING ---
 # ======================================================================
 
-def schedule_interview(scheduler, candidate_email: str, email_agent, role: str) -> None:
+def schedule_interview(scheduler, candidate_email: str, email_agent, role: str) -> Optional[int]:
+    """Book the interview and email the candidate.
+
+    Returns the outbox id of the confirmation when it was queued (a queued
+    email agent), otherwise None, including when scheduling failed.
+    """
     try:
         ist_tz = pytz.timezone('Asia/Kolkata')
         current_time_ist = datetime.now(ist_tz)
@@ -362,7 +1826,7 @@ def schedule_interview(scheduler, candidate_email: str, email_agent, role: str)
             """
         )
 
-        email_agent.run(
+        email_content = email_agent.draft(
             f"""Send interview confirmation email:
             - Role: {role}
             - Meeting Details: {meeting_response}
@@ -370,10 +1834,1252 @@ def schedule_interview(scheduler, candidate_email: str, email_agent, role: str)
             - Ask candidate to join 5 minutes early
             """
         )
+        outbox_id = email_agent.deliver(candidate_email, email_content)
         st.success("Interview scheduled successfully! Check your email for details.")
+        return outbox_id
     except Exception as e:
         logger.error(f"Error scheduling interview: {str(e)}")
         st.error("Unable to schedule interview. Please try again.")
+        return None
+
+# ======================================================================
+# --- CANDIDATE & INTERVIEW STORE ---
+# ======================================================================
+
+RECRUITMENT_DB_PATH = os.getenv("RECRUITMENT_DB_PATH", os.path.join("data", "recruitment.sqlite3"))
+
+# Record fields mirrored into indexed columns; the full record lives in `data`
+CANDIDATE_COLUMNS = ("name", "email", "role", "status", "analysis_date", "score", "email_status")
+INTERVIEW_COLUMNS = ("candidate_id", "candidate_email", "role", "status", "scheduled_date")
+
+class _Record:
+    """Slotted record that still reads like the dicts the pages were written for.
+
+    Known fields live in __slots__; anything else (older or newer keys) goes
+    to `extra`. A field left as None reads as missing through `get`.
+    """
+
+    __slots__ = ("id", "extra")
+    FIELDS: Tuple[str, ...] = ()
+    COMPUTED: Tuple[str, ...] = ()
+
+    def __init__(self, **values):
+        self.id = values.pop("id", None)
+        for field in self.FIELDS:
+            setattr(self, field, values.pop(field, None))
+        self.extra = values
+
+    def __getitem__(self, key):
+        if key == "id" or key in self.FIELDS or key in self.COMPUTED:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value) -> None:
+        if key == "id" or key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        record = {"id": self.id}
+        record.update((field, getattr(self, field)) for field in self.FIELDS)
+        record.update(self.extra)
+        return record
+
+def resume_text_digest(text: str) -> str:
+    """Key of a resume text in the store's resume_texts table."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CandidateRecord(_Record):
+    """Candidate record; the resume text is kept out of line, keyed by digest."""
+
+    __slots__ = FIELDS = ("name", "email", "role", "status", "feedback", "analysis_date", "score",
+                          "matching_skills", "missing_skills", "experience_level", "email_status",
+                          "resume_digest", "skill_profile")
+    COMPUTED = ("resume_text",)
+
+    @property
+    def resume_text(self) -> str:
+        """Loaded from the resume text store only when a view asks for it."""
+        return get_recruitment_store().get_resume_text(self.resume_digest)
+
+class InterviewRecord(_Record):
+    __slots__ = FIELDS = ("candidate_id", "candidate_name", "candidate_email", "role",
+                          "scheduled_date", "status", "template_used")
+
+class CandidateCounters:
+    """Candidate counts per status, per role and per (role, status).
+
+    Kept current by the store on every insert and status/role change, so
+    stat widgets read O(1) values instead of querying on each rerun.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.by_status: Counter = Counter()
+        self.by_role: Counter = Counter()
+        self.by_role_status: Counter = Counter()
+
+    def add(self, role: Optional[str], status: Optional[str], delta: int = 1) -> None:
+        self.total += delta
+        self.by_status[status] += delta
+        self.by_role[role] += delta
+        self.by_role_status[(role, status)] += delta
+
+    def count(self, status: Optional[str] = None, role: Optional[str] = None) -> int:
+        if status is not None and role is not None:
+            return self.by_role_status[(role, status)]
+        if status is not None:
+            return self.by_status[status]
+        if role is not None:
+            return self.by_role[role]
+        return self.total
+
+class RecruitmentStore:
+    """Durable SQLite (WAL) store for candidate and interview records.
+
+    Records are slotted CandidateRecord/InterviewRecord objects; resume text is
+    stored once per distinct content in `resume_texts` and referenced by its
+    SHA-256. Ids come from an AUTOINCREMENT sequence, so they are never
+    reused, and lookups by status, role, email and date hit indexes.
+    """
+
+    def __init__(self, path: str = RECRUITMENT_DB_PATH):
+        self._lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT, email TEXT, role TEXT, status TEXT,
+                analysis_date TEXT, score REAL, email_status TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_candidates_status ON candidates(status);
+            CREATE INDEX IF NOT EXISTS idx_candidates_role_status ON candidates(role, status);
+            CREATE INDEX IF NOT EXISTS idx_candidates_email ON candidates(email);
+            CREATE INDEX IF NOT EXISTS idx_candidates_analysis_date ON candidates(analysis_date);
+            CREATE INDEX IF NOT EXISTS idx_candidates_email_status ON candidates(email_status);
+            CREATE TABLE IF NOT EXISTS interviews (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                candidate_id INTEGER, candidate_email TEXT, role TEXT, status TEXT,
+                scheduled_date TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_interviews_candidate_id ON interviews(candidate_id);
+            CREATE INDEX IF NOT EXISTS idx_interviews_status ON interviews(status);
+            CREATE INDEX IF NOT EXISTS idx_interviews_scheduled_date ON interviews(scheduled_date);
+            CREATE TABLE IF NOT EXISTS resume_texts (
+                digest TEXT PRIMARY KEY,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS resume_signatures (
+                candidate_id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS candidate_skills (
+                candidate_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                skill TEXT NOT NULL COLLATE NOCASE
+            );
+            CREATE INDEX IF NOT EXISTS idx_candidate_skills_lookup ON candidate_skills(kind, skill);
+            CREATE INDEX IF NOT EXISTS idx_candidate_skills_candidate ON candidate_skills(candidate_id);
+        """)
+        self._conn.commit()
+
+        # One aggregate pass at open; every write afterwards adjusts these in place
+        self.counters = CandidateCounters()
+        for role, status, count in self._conn.execute(
+                "SELECT role, status, COUNT(*) FROM candidates GROUP BY role, status"):
+            self.counters.add(role, status, count)
+        self.interview_counts: Counter = Counter(dict(self._conn.execute(
+            "SELECT status, COUNT(*) FROM interviews GROUP BY status").fetchall()))
+        # Bumped on every candidate write; lets views cache derived data safely
+        self.data_version = 0
+        self.purge_orphan_resume_texts()
+
+    TABLES = {"candidates": (CandidateRecord, CANDIDATE_COLUMNS), "interviews": (InterviewRecord, INTERVIEW_COLUMNS)}
+
+    def put_resume_text(self, text: str) -> str:
+        """Store resume text once per distinct content and return its digest."""
+        digest = resume_text_digest(text)
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO resume_texts (digest, text) VALUES (?, ?)", (digest, text))
+            self._conn.commit()
+        return digest
+
+    def purge_orphan_resume_texts(self) -> int:
+        """Delete resume texts no candidate references (uploads that were never saved)."""
+        with self._lock:
+            deleted = self._conn.execute("""
+                DELETE FROM resume_texts WHERE digest NOT IN (
+                    SELECT json_extract(data, '$.resume_digest') FROM candidates
+                    WHERE json_extract(data, '$.resume_digest') IS NOT NULL
+                )
+            """).rowcount
+            self._conn.commit()
+        return deleted
+
+    def get_resume_text(self, digest: Optional[str]) -> str:
+        if not digest:
+            return ""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM resume_texts WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else ""
+
+    def save_resume_signature(self, candidate_id: int, signature: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resume_signatures (candidate_id, signature) VALUES (?, ?)",
+                (candidate_id, signature)
+            )
+            self._conn.commit()
+
+    def iter_resume_signatures(self) -> Iterator[Tuple[int, bytes]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT candidate_id, signature FROM resume_signatures").fetchall()
+        return iter(rows)
+
+    def _to_record(self, table: str, values) -> _Record:
+        record_cls = self.TABLES[table][0]
+        if isinstance(values, record_cls):
+            return values
+        values = dict(values)
+        # Inline resume text (new dicts, or rows written before the text store) moves out of line
+        resume_text = values.pop("resume_text", None)
+        if resume_text and record_cls is CandidateRecord and not values.get("resume_digest"):
+            values["resume_digest"] = self.put_resume_text(resume_text)
+        return record_cls(**values)
+
+    def _load(self, table: str, row) -> _Record:
+        record = self._to_record(table, json.loads(row[1]))
+        record.id = row[0]
+        return record
+
+    @staticmethod
+    def _dump(record: _Record) -> str:
+        data = record.to_dict()
+        del data["id"]
+        return json.dumps(data)
+
+    def _insert(self, table: str, values) -> _Record:
+        record = self._to_record(table, values)
+        columns = self.TABLES[table][1]
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}, data) VALUES ({', '.join('?' * (len(columns) + 1))})",
+                [record.get(c) for c in columns] + [self._dump(record)]
+            )
+            self._conn.commit()
+        record.id = cur.lastrowid
+        return record
+
+    def _select(self, table: str, where: Dict, order_by: Optional[str], limit: Optional[int],
+                conditions: Iterable[Tuple[str, object]] = ()) -> List[_Record]:
+        # `conditions` are extra (sql, param) filters for lookups that are not a column match
+        clauses = [f"{k} = ?" for k in where]
+        params = list(where.values())
+        for clause, param in conditions:
+            clauses.append(clause)
+            params.append(param)
+        sql = f"SELECT id, data FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._load(table, row) for row in rows]
+
+    def _iter(self, table: str, batch_size: int, where: Optional[Dict] = None,
+              after_id: int = 0) -> Iterator[_Record]:
+        # Keyset pagination: only one batch of rows is in memory at a time
+        where = where or {}
+        filters = "".join(f" AND {k} = ?" for k in where)
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM {table} WHERE id > ?{filters} ORDER BY id LIMIT ?",
+                    [last_id, *where.values(), batch_size]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._load(table, row)
+            last_id = rows[-1][0]
+
+    def _save_skills(self, record: CandidateRecord) -> None:
+        # Caller holds the lock and commits
+        self._conn.execute("DELETE FROM candidate_skills WHERE candidate_id = ?", (record.id,))
+        self._conn.executemany(
+            "INSERT INTO candidate_skills (candidate_id, kind, skill) VALUES (?, ?, ?)",
+            [(record.id, kind, skill)
+             for kind in ("matching", "missing")
+             for skill in dict.fromkeys(record.get(f"{kind}_skills", []))]
+        )
+
+    def add_candidate(self, record) -> CandidateRecord:
+        """Insert a candidate (record or dict) and return it with its assigned id."""
+        with self._lock:
+            record = self._insert("candidates", record)
+            self._save_skills(record)
+            self._conn.commit()
+            self.counters.add(record.role, record.status)
+            self.data_version += 1
+        return record
+
+    def update_candidate(self, candidate_id: int, **fields) -> Optional[CandidateRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT id, data FROM candidates WHERE id = ?", (candidate_id,)).fetchone()
+            if row is None:
+                return None
+            record = self._load("candidates", row)
+            previous = (record.role, record.status)
+            for key, value in fields.items():
+                record[key] = value
+            self._conn.execute(
+                f"UPDATE candidates SET {', '.join(f'{c} = ?' for c in CANDIDATE_COLUMNS)}, data = ? WHERE id = ?",
+                [record.get(c) for c in CANDIDATE_COLUMNS] + [self._dump(record), candidate_id]
+            )
+            if "matching_skills" in fields or "missing_skills" in fields:
+                self._save_skills(record)
+            self._conn.commit()
+            current = (record.role, record.status)
+            if current != previous:
+                self.counters.add(*previous, delta=-1)
+                self.counters.add(*current)
+            self.data_version += 1
+        return record
+
+    def get_candidate(self, candidate_id: int) -> Optional[CandidateRecord]:
+        found = self._select("candidates", {"id": candidate_id}, None, 1)
+        return found[0] if found else None
+
+    def candidates(self, status: Optional[str] = None, role: Optional[str] = None,
+                   email: Optional[str] = None, email_status: Optional[str] = None,
+                   limit: Optional[int] = None, newest_first: bool = False,
+                   skill: Optional[str] = None, missing_skill: Optional[str] = None) -> List[CandidateRecord]:
+        """Filter candidates; `skill`/`missing_skill` match analysis skills case-insensitively."""
+        where = {k: v for k, v in (("status", status), ("role", role), ("email", email),
+                                   ("email_status", email_status)) if v is not None}
+        conditions = [
+            ("id IN (SELECT candidate_id FROM candidate_skills WHERE kind = "
+             f"'{kind}' AND skill = ?)", value.strip())
+            for kind, value in (("matching", skill), ("missing", missing_skill)) if value
+        ]
+        order_by = "analysis_date DESC, id DESC" if newest_first else "id"
+        return self._select("candidates", where, order_by, limit, conditions)
+
+    def skill_counts(self, kind: Literal["matching", "missing"] = "missing", role: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Most common matching or missing skills, e.g. for a skill-gap report."""
+        sql = "SELECT s.skill, COUNT(DISTINCT s.candidate_id) AS n FROM candidate_skills s"
+        params: List = [kind]
+        if role is not None:
+            sql += " JOIN candidates c ON c.id = s.candidate_id WHERE s.kind = ? AND c.role = ?"
+            params.append(role)
+        else:
+            sql += " WHERE s.kind = ?"
+        sql += " GROUP BY s.skill ORDER BY n DESC, s.skill"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def count_candidates(self, status: Optional[str] = None, role: Optional[str] = None) -> int:
+        with self._lock:
+            return self.counters.count(status=status, role=role)
+
+    def count_candidates_by(self, column: str) -> Dict[str, int]:
+        """Candidate counts grouped by an indexed column, e.g. 'role' or 'status'."""
+        if column in ("role", "status"):
+            with self._lock:
+                counts = self.counters.by_role if column == "role" else self.counters.by_status
+                return {k: v for k, v in counts.items() if v > 0}
+        if column not in CANDIDATE_COLUMNS:
+            raise ValueError(f"Unknown candidate column: {column}")
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {column}, COUNT(*) FROM candidates GROUP BY {column}").fetchall()
+        return dict(rows)
+
+    def iter_candidates(self, batch_size: int = 500, role: Optional[str] = None,
+                        status: Optional[str] = None, after_id: int = 0) -> Iterator[CandidateRecord]:
+        where = {k: v for k, v in (("role", role), ("status", status)) if v is not None}
+        return self._iter("candidates", batch_size, where, after_id)
+
+    def save_candidates(self, records: Iterable[CandidateRecord]) -> None:
+        """Write back already-loaded records in one transaction (role/status must be unchanged)."""
+        with self._lock:
+            self._conn.executemany(
+                f"UPDATE candidates SET {', '.join(f'{c} = ?' for c in CANDIDATE_COLUMNS)}, data = ? WHERE id = ?",
+                [[r.get(c) for c in CANDIDATE_COLUMNS] + [self._dump(r), r.id] for r in records]
+            )
+            self._conn.commit()
+            self.data_version += 1
+
+    def counts_snapshot(self) -> Tuple[int, Dict[str, int], Dict[str, int]]:
+        """Return (data_version, counts by status, counts by role) read atomically."""
+        with self._lock:
+            return (self.data_version,
+                    {k: v for k, v in self.counters.by_status.items() if v > 0},
+                    {k: v for k, v in self.counters.by_role.items() if v > 0})
+
+    def add_interview(self, record) -> InterviewRecord:
+        with self._lock:
+            record = self._insert("interviews", record)
+            self.interview_counts[record.status] += 1
+        return record
+
+    def interviews(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[InterviewRecord]:
+        where = {"status": status} if status is not None else {}
+        return self._select("interviews", where, "id", limit)
+
+    def iter_interviews(self, batch_size: int = 500) -> Iterator[InterviewRecord]:
+        return self._iter("interviews", batch_size)
+
+    def count_interviews(self, status: Optional[str] = None) -> int:
+        with self._lock:
+            if status is not None:
+                return self.interview_counts[status]
+            return sum(self.interview_counts.values())
+
+_recruitment_store: Optional[RecruitmentStore] = None
+_recruitment_store_lock = threading.Lock()
+
+def get_recruitment_store() -> RecruitmentStore:
+    """Return the process-wide recruitment store, opening the database on first use."""
+    global _recruitment_store
+    if _recruitment_store is None:
+        with _recruitment_store_lock:
+            if _recruitment_store is None:
+                _recruitment_store = RecruitmentStore()
+    return _recruitment_store
+
+# ======================================================================
+# --- NEAR-DUPLICATE RESUME DETECTION ---
+# ======================================================================
+
+MINHASH_NUM_PERM = 128
+MINHASH_BANDS = 16          # 16 bands x 8 rows: candidate pairs from roughly 0.7 Jaccard
+MINHASH_SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_minhash_rng = np.random.RandomState(20240601)
+_MINHASH_A = _minhash_rng.randint(1, _MERSENNE_PRIME, size=MINHASH_NUM_PERM).astype(np.uint64)
+_MINHASH_B = _minhash_rng.randint(0, _MERSENNE_PRIME, size=MINHASH_NUM_PERM).astype(np.uint64)
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature over word shingles of the normalized resume text."""
+    words = re.findall(r"\w+", (text or "").lower())
+    size = MINHASH_SHINGLE_SIZE
+    shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    hashes = np.fromiter((zlib.crc32(sh.encode("utf-8")) for sh in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (perm x shingle) universal hashes, min over shingles; fits in uint64 since a, x < 2^32
+    permuted = (np.outer(_MINHASH_A, hashes) + _MINHASH_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+class ResumeDuplicateIndex:
+    """MinHash LSH index over candidate resumes.
+
+    Each signature is split into bands; resumes sharing any band land in a
+    common bucket, so a lookup only compares against bucket members rather
+    than the whole corpus.
+    """
+
+    def __init__(self, num_perm: int = MINHASH_NUM_PERM, bands: int = MINHASH_BANDS):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, candidate_id: int, signature: np.ndarray) -> None:
+        with self._lock:
+            self._signatures[candidate_id] = signature
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                bucket.setdefault(key, []).append(candidate_id)
+
+    def query(self, signature: np.ndarray, threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple[int, float]]:
+        """Return (candidate_id, estimated Jaccard similarity) above threshold, best first."""
+        with self._lock:
+            matches = set()
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                matches.update(bucket.get(key, ()))
+            scored = [(cid, float(np.mean(self._signatures[cid] == signature))) for cid in matches]
+        return sorted((m for m in scored if m[1] >= threshold), key=lambda m: m[1], reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+_duplicate_index: Optional[ResumeDuplicateIndex] = None
+_duplicate_index_lock = threading.Lock()
+
+def get_duplicate_index() -> ResumeDuplicateIndex:
+    """Return the process-wide duplicate index, loading stored signatures on first use."""
+    global _duplicate_index
+    if _duplicate_index is None:
+        with _duplicate_index_lock:
+            if _duplicate_index is None:
+                index = ResumeDuplicateIndex()
+                for candidate_id, blob in get_recruitment_store().iter_resume_signatures():
+                    index.add(candidate_id, np.frombuffer(blob, dtype=np.uint32))
+                _duplicate_index = index
+    return _duplicate_index
+
+def index_candidate_resume(candidate) -> None:
+    """Add a saved candidate's resume to the duplicate index and persist its signature."""
+    signature = minhash_signature(candidate.resume_text)
+    get_recruitment_store().save_resume_signature(candidate.id, signature.tobytes())
+    get_duplicate_index().add(candidate.id, signature)
+
+def find_duplicate_candidates(resume_text: str, role: Optional[str] = None,
+                              threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple["CandidateRecord", float]]:
+    """Previously analyzed candidates whose resume is a near-duplicate of `resume_text`.
+
+    With `role`, only candidates screened for that role are returned.
+    """
+    store = get_recruitment_store()
+    found = []
+    for candidate_id, similarity in get_duplicate_index().query(minhash_signature(resume_text), threshold):
+        candidate = store.get_candidate(candidate_id)
+        if candidate is not None and (role is None or candidate.role == role):
+            found.append((candidate, similarity))
+    return found
+
+def resume_diff(old_text: str, new_text: str, max_lines: int = 200) -> str:
+    """Unified line diff between two resume texts, for checking a reused verdict."""
+    diff = difflib.unified_diff(old_text.splitlines(), new_text.splitlines(),
+                                fromfile="previous", tofile="new", lineterm="")
+    return "\n".join(line for _, line in zip(range(max_lines), diff))
+
+# ======================================================================
+# --- FULL-TEXT CANDIDATE SEARCH ---
+# ======================================================================
+
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.join("data", "search_index"))
+# Documents buffered in memory before they are written out as a new segment
+SEARCH_INDEX_FLUSH_DOCS = int(os.getenv("SEARCH_INDEX_FLUSH_DOCS", "200"))
+# Same-tier segments merged at once; segment sizes grow by this factor per tier
+SEARCH_INDEX_MERGE_FACTOR = int(os.getenv("SEARCH_INDEX_MERGE_FACTOR", "10"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_SEARCH_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+def tokenize_search(text: str) -> List[str]:
+    """Lower-cased search terms; keeps names like c++, c# and node.js whole."""
+    return _SEARCH_TOKEN_RE.findall((text or "").lower())
+
+def candidate_search_text(candidate) -> str:
+    """Text indexed for a candidate: resume, feedback, skills and name."""
+    return "\n".join([
+        candidate.get('name', ''),
+        candidate.get('resume_text', ''),
+        candidate.get('feedback', ''),
+        " ".join(candidate.get('matching_skills', [])),
+        " ".join(candidate.get('missing_skills', [])),
+    ])
+
+def parse_search_query(query: str) -> List[Tuple[List[str], List[str]]]:
+    """Split a query into OR-ed groups of (required terms, excluded terms).
+
+    Words within a group are AND-ed; "AND" is optional, "OR" starts a new
+    group and "NOT term" or "-term" excludes a term. Operators are upper-case.
+    """
+    groups: List[Tuple[List[str], List[str]]] = [([], [])]
+    negate = False
+    for word in query.split():
+        if word == "OR":
+            groups.append(([], []))
+        elif word == "AND":
+            continue
+        elif word == "NOT":
+            negate = True
+            continue
+        else:
+            if word.startswith("-") and len(word) > 1:
+                negate, word = True, word[1:]
+            groups[-1][1 if negate else 0].extend(tokenize_search(word))
+        negate = False
+    return [group for group in groups if group[0]]
+
+class _SearchSegment:
+    """One immutable on-disk segment: sorted terms, CSR offsets into flat posting
+    arrays (segment-local document ordinal, term frequency) and per-document
+    ids and lengths, all loaded with mmap."""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        path = os.path.join(directory, name)
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as fh:
+            self.term_list: List[str] = json.load(fh)
+        self.terms = {term: i for i, term in enumerate(self.term_list)}
+        load = lambda array: np.load(os.path.join(path, f"{array}.npy"), mmap_mode="r")
+        self.offsets, self.ordinals, self.tfs = load("offsets"), load("ordinals"), load("tfs")
+        self.doc_ids, self.doc_lens = load("doc_ids"), load("doc_lens")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @staticmethod
+    def write(directory: str, term_list: List[str], offsets: np.ndarray, ordinals: np.ndarray,
+              tfs: np.ndarray, doc_ids: np.ndarray, doc_lens: np.ndarray) -> str:
+        """Write a new segment directory and return its name."""
+        name = f"segment-{time.time_ns()}"
+        path = os.path.join(directory, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as fh:
+            json.dump(term_list, fh)
+        np.save(os.path.join(path, "offsets.npy"), offsets.astype(np.int64))
+        np.save(os.path.join(path, "ordinals.npy"), ordinals.astype(np.uint32))
+        np.save(os.path.join(path, "tfs.npy"), tfs.astype(np.uint16))
+        np.save(os.path.join(path, "doc_ids.npy"), doc_ids.astype(np.int64))
+        np.save(os.path.join(path, "doc_lens.npy"), doc_lens.astype(np.uint32))
+        return name
+
+class _SearchBuffer:
+    """In-memory postings for documents not yet written to a segment; ordinals are buffer-local."""
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.doc_ids: List[int] = []
+        self.doc_lens: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: int, terms: Counter) -> None:
+        ordinal = len(self.doc_ids)
+        for term, tf in terms.items():
+            postings = self.postings.setdefault(term, ([], []))
+            postings[0].append(ordinal)
+            postings[1].append(tf)
+        self.doc_ids.append(doc_id)
+        self.doc_lens.append(sum(terms.values()))
+
+    def write(self, directory: str) -> str:
+        """Write the buffer out as a segment and return its name."""
+        vocabulary = sorted(self.postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum([len(self.postings[term][0]) for term in vocabulary], out=offsets[1:])
+        ordinals = [ordinal for term in vocabulary for ordinal in self.postings[term][0]]
+        tfs = [tf for term in vocabulary for tf in self.postings[term][1]]
+        return _SearchSegment.write(
+            directory, vocabulary, offsets, np.asarray(ordinals, dtype=np.uint32),
+            np.minimum(tfs, np.iinfo(np.uint16).max), np.asarray(self.doc_ids, dtype=np.int64),
+            np.asarray(self.doc_lens, dtype=np.uint32),
+        )
+
+def _merge_search_segments(directory: str, segments: List[_SearchSegment]) -> str:
+    """Merge consecutive segments into one and return its name; vectorized over postings."""
+    vocabulary = np.unique(np.concatenate([np.asarray(s.term_list, dtype=str) for s in segments]))
+    term_idx, ordinals, tfs = [], [], []
+    base = 0
+    for segment in segments:
+        # Map each posting to its term's slot in the merged vocabulary
+        local_terms = np.searchsorted(vocabulary, np.asarray(segment.term_list, dtype=str))
+        term_idx.append(np.repeat(local_terms, np.diff(segment.offsets)))
+        ordinals.append(np.asarray(segment.ordinals, dtype=np.int64) + base)
+        tfs.append(np.asarray(segment.tfs))
+        base += len(segment)
+    term_idx, ordinals, tfs = np.concatenate(term_idx), np.concatenate(ordinals), np.concatenate(tfs)
+    # Stable sort keeps each term's postings in ordinal order (segments are in document order)
+    order = np.argsort(term_idx, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_idx, minlength=len(vocabulary)), out=offsets[1:])
+    return _SearchSegment.write(
+        directory, vocabulary.tolist(), offsets, ordinals[order], tfs[order],
+        np.concatenate([s.doc_ids for s in segments]), np.concatenate([s.doc_lens for s in segments]),
+    )
+
+class CandidateSearchIndex:
+    """BM25 inverted index over candidate text, persisted as on-disk segments.
+
+    New documents go to an in-memory buffer. Every SEARCH_INDEX_FLUSH_DOCS
+    adds a background thread writes the buffer out as a small segment, then
+    merges tiers: once SEARCH_INDEX_MERGE_FACTOR segments of the same size
+    class sit at the tail they are merged into one, so each document is
+    rewritten O(log N) times. The CURRENT file lists the live segments in
+    document order. Documents missing from disk after a crash are re-indexed
+    from the store when the index is opened.
+    """
+
+    def __init__(self, directory: str = SEARCH_INDEX_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()          # in-memory state, held briefly
+        self._write_lock = threading.Lock()    # serializes segment writes and merges
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-merge")
+        self._flush_scheduled = False
+        os.makedirs(directory, exist_ok=True)
+        self._segments = [_SearchSegment(directory, name) for name in self._read_current()]
+        self._indexed_ids = {doc_id for segment in self._segments for doc_id in segment.doc_ids.tolist()}
+        self._buffers = [_SearchBuffer()]    # the last one takes new documents
+        self._invalidate()
+
+    # -- segment I/O ------------------------------------------------------
+
+    def _read_current(self) -> List[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), encoding="utf-8") as fh:
+                return [line.strip() for line in fh if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write_current(self, segments: List[_SearchSegment]) -> None:
+        current_tmp = os.path.join(self.directory, "CURRENT.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as fh:
+            fh.write("".join(f"{segment.name}\n" for segment in segments))
+        os.replace(current_tmp, os.path.join(self.directory, "CURRENT"))
+
+    def _invalidate(self) -> None:
+        self._all_lens: Optional[np.ndarray] = None
+        self._all_ids: Optional[np.ndarray] = None
+
+    def flush(self) -> None:
+        """Write buffered documents out as a new segment (cost proportional to the buffer).
+
+        The buffer is frozen under the lock and written without it, so adds
+        and searches are not held up; it stays searchable until the segment
+        replaces it.
+        """
+        with self._write_lock:
+            with self._lock:
+                self._flush_scheduled = False
+                # Earlier buffers are still here if a previous flush failed
+                frozen = [buffer for buffer in self._buffers if len(buffer)]
+                if not frozen:
+                    return
+                self._buffers.append(_SearchBuffer())
+            segments = self._segments + [_SearchSegment(self.directory, buffer.write(self.directory))
+                                         for buffer in frozen]
+            self._write_current(segments)
+            with self._lock:
+                self._segments = segments
+                self._buffers = [buffer for buffer in self._buffers if buffer not in frozen]
+                self._invalidate()
+
+    @staticmethod
+    def _tier(segment: _SearchSegment) -> int:
+        """Size class: 0 below FLUSH_DOCS * MERGE_FACTOR documents, +1 per further factor."""
+        factor = max(SEARCH_INDEX_MERGE_FACTOR, 2)
+        tier, capacity = 0, max(SEARCH_INDEX_FLUSH_DOCS, 1) * factor
+        while len(segment) >= capacity:
+            tier, capacity = tier + 1, capacity * factor
+        return tier
+
+    def merge(self) -> None:
+        """Tiered merge: fold runs of SEARCH_INDEX_MERGE_FACTOR same-tier tail segments into one.
+
+        Searches keep using the old segments until the merged one is written.
+        """
+        with self._write_lock:
+            while True:
+                segments = self._segments
+                if not segments:
+                    return
+                tier = self._tier(segments[-1])
+                run = 1
+                while run < len(segments) and self._tier(segments[-run - 1]) == tier:
+                    run += 1
+                if run < max(SEARCH_INDEX_MERGE_FACTOR, 2):
+                    return
+                name = _merge_search_segments(self.directory, segments[-run:])
+                merged = segments[:-run] + [_SearchSegment(self.directory, name)]
+                self._write_current(merged)
+                with self._lock:
+                    self._segments = merged
+                    self._invalidate()
+                for segment in segments[-run:]:
+                    shutil.rmtree(os.path.join(self.directory, segment.name), ignore_errors=True)
+
+    def _flush_and_merge(self) -> None:
+        try:
+            self.flush()
+            self.merge()
+        except Exception as e:
+            logger.error(f"Search index flush failed: {e}")
+
+    # -- updates and queries ----------------------------------------------
+
+    def add(self, doc_id: int, text: str, autoflush: bool = True) -> None:
+        terms = Counter(tokenize_search(text))
+        with self._lock:
+            if doc_id in self._indexed_ids:
+                return
+            self._buffers[-1].add(doc_id, terms)
+            self._indexed_ids.add(doc_id)
+            self._invalidate()
+            # Flushing and merging run off the caller's thread
+            schedule = autoflush and not self._flush_scheduled and len(self._buffers[-1]) >= SEARCH_INDEX_FLUSH_DOCS
+            if schedule:
+                self._flush_scheduled = True
+        if schedule:
+            self._background.submit(self._flush_and_merge)
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        parts_ord, parts_tf = [], []
+        base = 0
+        for segment in self._segments:
+            idx = segment.terms.get(term)
+            if idx is not None:
+                lo, hi = segment.offsets[idx], segment.offsets[idx + 1]
+                parts_ord.append(np.asarray(segment.ordinals[lo:hi], dtype=np.int64) + base)
+                parts_tf.append(segment.tfs[lo:hi])
+            base += len(segment)
+        for buffer in self._buffers:
+            postings = buffer.postings.get(term)
+            if postings is not None:
+                parts_ord.append(np.asarray(postings[0], dtype=np.int64) + base)
+                parts_tf.append(np.asarray(postings[1], dtype=np.uint16))
+            base += len(buffer)
+        if not parts_ord:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+        return np.concatenate(parts_ord), np.concatenate(parts_tf)
+
+    def search(self, query: str, limit: Optional[int] = 20) -> List[Tuple[int, float]]:
+        """Return (candidate id, BM25 score) pairs matching `query`, best first."""
+        groups = parse_search_query(query)
+        with self._lock:
+            if self._all_lens is None:
+                parts = self._segments + self._buffers
+                self._all_lens = np.concatenate([np.asarray(p.doc_lens, dtype=np.uint32) for p in parts])
+                self._all_ids = np.concatenate([np.asarray(p.doc_ids, dtype=np.int64) for p in parts])
+            lens = self._all_lens.astype(np.float64)
+            n_docs = len(lens)
+            if not groups or n_docs == 0:
+                return []
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lens / max(lens.mean(), 1.0))
+            scores = np.zeros(n_docs)
+            matched = np.zeros(n_docs, dtype=bool)
+            for required, excluded in groups:
+                group_mask = np.ones(n_docs, dtype=bool)
+                group_score = np.zeros(n_docs)
+                for term in dict.fromkeys(required):
+                    ordinals, tfs = self._postings(term)
+                    present = np.zeros(n_docs, dtype=bool)
+                    present[ordinals] = True
+                    group_mask &= present
+                    if not group_mask.any():
+                        break
+                    idf = math.log(1 + (n_docs - len(ordinals) + 0.5) / (len(ordinals) + 0.5))
+                    tf = tfs.astype(np.float64)
+                    group_score[ordinals] += idf * tf * (BM25_K1 + 1) / (tf + norm[ordinals])
+                for term in excluded:
+                    group_mask[self._postings(term)[0]] = False
+                matched |= group_mask
+                # OR-ed groups: a document scores as its best matching group
+                scores = np.maximum(scores, np.where(group_mask, group_score, 0.0))
+            hits = np.flatnonzero(matched)
+            hits = hits[np.argsort(-scores[hits], kind="stable")][:limit]
+            return [(int(self._all_ids[h]), float(scores[h])) for h in hits]
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._segments + self._buffers)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._indexed_ids
+
+    @property
+    def max_doc_id(self) -> int:
+        return max(self._indexed_ids, default=0)
+
+_search_index: Optional[CandidateSearchIndex] = None
+_search_index_lock = threading.Lock()
+
+def get_search_index() -> CandidateSearchIndex:
+    """Return the process-wide search index, indexing any stored candidates it is missing."""
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                index = CandidateSearchIndex()
+                for candidate in get_recruitment_store().iter_candidates(after_id=index.max_doc_id):
+                    index.add(candidate.id, candidate_search_text(candidate), autoflush=False)
+                index.flush()
+                atexit.register(index.flush)
+                _search_index = index
+    return _search_index
+
+def index_candidate_search(candidate) -> None:
+    """Add a saved candidate to the full-text search index."""
+    get_search_index().add(candidate.id, candidate_search_text(candidate))
+
+def search_candidates(query: str, role: Optional[str] = None,
+                      limit: int = 20) -> List[Tuple["CandidateRecord", float]]:
+    """Candidates matching a search query such as "kubernetes AND pytorch", best first."""
+    store = get_recruitment_store()
+    found = []
+    for candidate_id, score in get_search_index().search(query, limit=None if role else limit):
+        candidate = store.get_candidate(candidate_id)
+        if candidate is not None and (role is None or candidate.role == role):
+            found.append((candidate, score))
+            if len(found) == limit:
+                break
+    return found
+
+# ======================================================================
+# --- CANDIDATE SIMILARITY ---
+# ======================================================================
+
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join("data", "similarity_index.npz"))
+SIMILARITY_SAVE_EVERY = int(os.getenv("SIMILARITY_SAVE_EVERY", "200"))
+# Rows per block in the (documents x queries) sparse product
+SIMILARITY_BLOCK_ROWS = 20000
+
+def _similarity_terms(text: str) -> Counter:
+    return Counter(t for t in tokenize_search(text) if len(t) > 1 and not t.isdigit())
+
+class ResumeSimilarityIndex:
+    """Sparse TF-IDF index over resume text for cosine "more like this" queries.
+
+    Documents are rows of a CSR matrix of sublinear term frequencies
+    (data/indices/indptr as NumPy arrays). IDF weights and row norms are
+    derived from the matrix on demand, so adding a resume only appends a
+    row. Queries are answered block-wise with a sparse (docs x terms) by
+    dense (terms x queries) product. Every SIMILARITY_SAVE_EVERY adds the
+    matrix is rewritten on a background thread, not the caller's.
+    """
+
+    def __init__(self, path: str = SIMILARITY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()          # in-memory state, held briefly
+        self._save_lock = threading.Lock()     # serializes writes of the .npz
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similarity-save")
+        self._save_scheduled = False
+        self._vocab: Dict[str, int] = {}
+        self._data = np.zeros(0, dtype=np.float32)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        self._pending: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        self._row_of: Dict[int, int] = {}
+        self._weights: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._unsaved = 0
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as saved:
+                self._data, self._indices = saved["data"], saved["indices"]
+                self._indptr, self._doc_ids = saved["indptr"], saved["doc_ids"]
+                self._vocab = {term: i for i, term in enumerate(saved["vocab"].tolist())}
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self._doc_ids.tolist())}
+
+    def add(self, doc_id: int, text: str, autosave: bool = True) -> None:
+        terms = _similarity_terms(text)
+        with self._lock:
+            if doc_id in self._row_of:
+                return
+            columns = np.array([self._vocab.setdefault(t, len(self._vocab)) for t in terms], dtype=np.int32)
+            values = 1.0 + np.log(np.fromiter(terms.values(), dtype=np.float32, count=len(terms)))
+            self._row_of[doc_id] = len(self._row_of)
+            self._pending.append((doc_id, columns, values))
+            self._weights = None
+            self._unsaved += 1
+            due = autosave and not self._save_scheduled and self._unsaved >= SIMILARITY_SAVE_EVERY
+            if due:
+                self._save_scheduled = True
+        if due:
+            self._background.submit(self._save_in_background)
+
+    def _consolidate(self) -> None:
+        # Caller holds the lock
+        if not self._pending:
+            return
+        lengths = np.array([len(cols) for _, cols, _ in self._pending], dtype=np.int64)
+        self._indptr = np.concatenate([self._indptr, self._indptr[-1] + np.cumsum(lengths)])
+        self._indices = np.concatenate([self._indices] + [cols for _, cols, _ in self._pending])
+        self._data = np.concatenate([self._data] + [vals for _, _, vals in self._pending]).astype(np.float32)
+        self._doc_ids = np.concatenate([self._doc_ids, np.array([d for d, _, _ in self._pending], dtype=np.int64)])
+        self._pending = []
+
+    def _tfidf(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(idf per term, row norms, tf-idf value and row of every stored entry).
+
+        Recomputed only after the matrix changed.
+        """
+        if self._weights is None:
+            self._consolidate()
+            n_docs = len(self._doc_ids)
+            df = np.bincount(self._indices, minlength=len(self._vocab))
+            idf = (np.log((1 + n_docs) / (1 + df)) + 1.0).astype(np.float32)
+            weighted = self._data * idf[self._indices]
+            rows = np.repeat(np.arange(n_docs), np.diff(self._indptr))
+            norms = np.sqrt(np.bincount(rows, weighted.astype(np.float64) ** 2, minlength=n_docs))
+            self._weights = (idf, np.maximum(norms, 1e-12).astype(np.float32), weighted, rows)
+        return self._weights
+
+    def save(self) -> None:
+        """Write the matrix to disk; only the snapshot is taken under the lock."""
+        with self._save_lock:
+            with self._lock:
+                self._save_scheduled = False
+                self._consolidate()
+                # Consolidation builds new arrays, so these stay unchanged while written
+                arrays = dict(data=self._data, indices=self._indices, indptr=self._indptr,
+                              doc_ids=self._doc_ids, vocab=np.array(sorted(self._vocab, key=self._vocab.get), dtype=str))
+                unsaved = self._unsaved
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, self.path)
+            with self._lock:
+                self._unsaved -= unsaved
+
+    def _save_in_background(self) -> None:
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Similarity index save failed: {e}")
+
+    def similar(self, doc_ids: List[int], k: int = 5,
+                allowed: Optional[Callable[[int], bool]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        """Cosine top-k neighbours for each indexed doc id in `doc_ids` (itself excluded)."""
+        with self._lock:
+            idf, norms, weighted, entry_rows = self._tfidf()
+            query_rows = [self._row_of[d] for d in doc_ids if d in self._row_of]
+            if not query_rows:
+                return {}
+            # Dense (terms x queries) matrix of normalised query vectors
+            queries = np.zeros((len(self._vocab), len(query_rows)), dtype=np.float32)
+            for j, row in enumerate(query_rows):
+                lo, hi = self._indptr[row], self._indptr[row + 1]
+                cols = self._indices[lo:hi]
+                queries[cols, j] = self._data[lo:hi] * idf[cols] / norms[row]
+            n_docs = len(self._doc_ids)
+            scores = np.zeros((n_docs, len(query_rows)), dtype=np.float32)
+            for start in range(0, n_docs, SIMILARITY_BLOCK_ROWS):
+                stop = min(start + SIMILARITY_BLOCK_ROWS, n_docs)
+                lo, hi = self._indptr[start], self._indptr[stop]
+                if hi == lo:
+                    continue
+                products = weighted[lo:hi, None] * queries[self._indices[lo:hi]]
+                rows = entry_rows[lo:hi] - start
+                for j in range(len(query_rows)):
+                    scores[start:stop, j] = np.bincount(rows, products[:, j], minlength=stop - start)
+                scores[start:stop] /= norms[start:stop, None]
+            doc_ids_arr = self._doc_ids
+
+        results: Dict[int, List[Tuple[int, float]]] = {}
+        for j, row in enumerate(query_rows):
+            column = scores[:, j]
+            column[row] = -1.0
+            neighbours = []
+            # Best first; stop once k neighbours pass the filter
+            for other in np.argsort(-column, kind="stable"):
+                if column[other] <= 0 or len(neighbours) == k:
+                    break
+                other_id = int(doc_ids_arr[other])
+                if allowed is None or allowed(other_id):
+                    neighbours.append((other_id, float(column[other])))
+            results[int(doc_ids_arr[row])] = neighbours
+        return results
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._row_of
+
+    @property
+    def max_doc_id(self) -> int:
+        return max(self._row_of, default=0)
+
+_similarity_index: Optional[ResumeSimilarityIndex] = None
+_similarity_index_lock = threading.Lock()
+
+def get_similarity_index() -> ResumeSimilarityIndex:
+    """Return the process-wide similarity index, adding stored resumes it is missing."""
+    global _similarity_index
+    if _similarity_index is None:
+        with _similarity_index_lock:
+            if _similarity_index is None:
+                index = ResumeSimilarityIndex()
+                for candidate in get_recruitment_store().iter_candidates(after_id=index.max_doc_id):
+                    index.add(candidate.id, candidate.resume_text, autosave=False)
+                index.save()
+                atexit.register(index.save)
+                _similarity_index = index
+    return _similarity_index
+
+def index_candidate_similarity(candidate) -> None:
+    """Add a saved candidate's resume to the similarity index."""
+    get_similarity_index().add(candidate.id, candidate.resume_text)
+
+def similar_candidates(candidate_id: int, k: int = 5,
+                       role: Optional[str] = None) -> List[Tuple["CandidateRecord", float]]:
+    """Candidates whose resumes are most like `candidate_id`'s, across all roles unless `role` is given."""
+    store = get_recruitment_store()
+    loaded: Dict[int, Optional[CandidateRecord]] = {}
+
+    def allowed(other_id: int) -> bool:
+        loaded[other_id] = store.get_candidate(other_id)
+        return loaded[other_id] is not None and (role is None or loaded[other_id].role == role)
+
+    neighbours = get_similarity_index().similar([candidate_id], k, allowed).get(candidate_id, [])
+    return [(loaded[other_id], score) for other_id, score in neighbours]
+
+# ======================================================================
+# --- CANDIDATE SCORING ---
+# ======================================================================
+
+# Relative weight of each requirement item (ROLE_REQUIREMENTS wording);
+# unlisted items weigh 1.0.
+SKILL_WEIGHTS: Dict[str, Dict[str, float]] = {
+    "ai_ml_engineer": {"Python": 1.5, "PyTorch/TensorFlow": 1.5, "Machine Learning algorithms and frameworks": 1.5},
+    "frontend_engineer": {"React/Vue.js/Angular": 1.5, "JavaScript/TypeScript": 1.5},
+    "backend_engineer": {"Python/Java/Node.js": 1.5, "REST APIs": 1.5, "Database design and management": 1.25},
+}
+# Profile value for a skill the resume mentions but the analysis listed as missing
+SKILL_DISPUTED_CREDIT = 0.5
+SCORE_CHUNK_ROWS = 500
+
+def skill_weight_vector(role: str) -> np.ndarray:
+    weights = SKILL_WEIGHTS.get(role, {})
+    return np.array([weights.get(skill, 1.0) for skill in get_skill_matcher(role).skills], dtype=np.float64)
+
+def skill_profile(resume_text: str, role: str, matching_skills: Iterable[str] = (),
+                  missing_skills: Iterable[str] = ()) -> np.ndarray:
+    """Per-skill credit in [0, 1] for one resume, aligned with the role's matcher skills.
+
+    Skills confirmed by the analysis get full credit; skills only found in the
+    text get full credit unless the analysis listed them as missing.
+    """
+    matcher = get_skill_matcher(role)
+    confirmed = matcher.hits("\n".join(matching_skills))
+    disputed = matcher.hits("\n".join(missing_skills)) - confirmed
+    profile = np.zeros(len(matcher.skills), dtype=np.float32)
+    for idx in matcher.hits(resume_text):
+        profile[idx] = SKILL_DISPUTED_CREDIT if idx in disputed else 1.0
+    profile[list(confirmed)] = 1.0
+    return profile
+
+def score_profiles(profiles: np.ndarray, role: str) -> np.ndarray:
+    """Weighted coverage (0-100) for a (candidates x skills) profile matrix in one product."""
+    weights = skill_weight_vector(role)
+    return np.round(profiles.astype(np.float64) @ weights * (100.0 / weights.sum()), 1)
+
+def score_candidate(candidate) -> float:
+    """Score a candidate record or dict, storing its skill profile alongside."""
+    resume_text = candidate.get('resume_text') or get_recruitment_store().get_resume_text(
+        candidate.get('resume_digest'))
+    profile = skill_profile(resume_text, candidate['role'],
+                            candidate.get('matching_skills', []), candidate.get('missing_skills', []))
+    candidate['skill_profile'] = profile.tolist()
+    candidate['score'] = float(score_profiles(profile[None, :], candidate['role'])[0])
+    return candidate['score']
+
+def _profile_matrix(candidates: List["CandidateRecord"], role: str) -> np.ndarray:
+    width = len(get_skill_matcher(role).skills)
+    rows = []
+    for candidate in candidates:
+        profile = candidate.get('skill_profile')
+        if profile is None or len(profile) != width:
+            # Record predates scoring or the taxonomy changed; rebuild from its text
+            profile = skill_profile(candidate.resume_text, role, candidate.get('matching_skills', []),
+                                    candidate.get('missing_skills', []))
+            candidate['skill_profile'] = profile.tolist()
+        rows.append(profile)
+    return np.array(rows, dtype=np.float32).reshape(len(rows), width)
+
+def _iter_scored_chunks(role: str, status: Optional[str]) -> Iterator[Tuple[List["CandidateRecord"], np.ndarray]]:
+    chunk: List[CandidateRecord] = []
+    for candidate in get_recruitment_store().iter_candidates(SCORE_CHUNK_ROWS, role=role, status=status):
+        chunk.append(candidate)
+        if len(chunk) == SCORE_CHUNK_ROWS:
+            yield chunk, score_profiles(_profile_matrix(chunk, role), role)
+            chunk = []
+    if chunk:
+        yield chunk, score_profiles(_profile_matrix(chunk, role), role)
+
+def top_candidates(role: str, k: int = 10, status: Optional[str] = None) -> List[Tuple["CandidateRecord", float]]:
+    """Best `k` candidates for `role` by current weights, best first.
+
+    Candidates are scored a chunk at a time and kept in a size-k min-heap, so
+    memory stays bounded by the chunk size whatever the pool size.
+    """
+    heap: List[Tuple[float, int, CandidateRecord]] = []
+    for chunk, scores in _iter_scored_chunks(role, status):
+        for candidate, score in zip(chunk, scores.tolist()):
+            # Ties go to the earlier applicant (smaller id)
+            entry = (score, -candidate.id, candidate)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+    return [(candidate, score) for score, _, candidate in sorted(heap, key=lambda e: e[:2], reverse=True)]
+
+def rescore_candidates(role: str) -> int:
+    """Recompute and store the score of every candidate for `role`; returns the count."""
+    store = get_recruitment_store()
+    updated = 0
+    for chunk, scores in _iter_scored_chunks(role, None):
+        for candidate, score in zip(chunk, scores.tolist()):
+            candidate['score'] = score
+        store.save_candidates(chunk)
+        updated += len(chunk)
+    return updated
+
+# ======================================================================
+# --- CSV EXPORT ---
+# ======================================================================
+
+# resume_text is available for export but left out unless asked for
+CANDIDATE_EXPORT_COLUMNS = ("id", "name", "email", "role", "status", "score", "feedback", "analysis_date",
+                            "matching_skills", "missing_skills", "experience_level", "email_status")
+INTERVIEW_EXPORT_COLUMNS = ("id", "candidate_id", "candidate_name", "candidate_email", "role",
+                            "scheduled_date", "status", "template_used")
+EXPORT_CHUNK_ROWS = 500
+
+def iter_csv_chunks(records: Iterable[Dict], columns: Iterable[str],
+                    chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """Yield CSV text in chunks of `chunk_rows` rows; list values are joined with '; '."""
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, record in enumerate(records, 1):
+        writer.writerow([
+            "; ".join(map(str, value)) if isinstance(value, (list, tuple)) else value
+            for value in (record.get(c) for c in columns)
+        ])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_csv(records: Iterable[Dict], columns: Iterable[str], compress: bool = False) -> bytes:
+    """Stream records as CSV (optionally gzipped on the fly) and return the file bytes.
+
+    Rows are encoded chunk by chunk into a temp file that spills to disk, so
+    no DataFrame or full CSV string is ever built; only the finished (and,
+    with `compress`, much smaller) file is read back for download.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as out:
+        sink = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+        for chunk in iter_csv_chunks(records, columns):
+            sink.write(chunk.encode("utf-8"))
+        if compress:
+            sink.close()
+        out.seek(0)
+        return out.read()
 
 # ======================================================================
 # --- MAIN APP ---
@@ -425,7 +3131,7 @@ def main() -> None:
     resume_file = st.file_uploader("Upload Resume (PDF)", type=["pdf"])
     if resume_file:
         st.subheader("Uploaded Resume")
-        text = extract_text_from_pdf(resume_file)
+        text = extract_text_from_pdf_bytes(resume_file.getvalue())
         if text:
             st.session_state.resume_text = text
             st.success("Resume processed successfully!")
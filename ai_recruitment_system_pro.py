@@ -2,13 +2,13 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import hashlib
 from datetime import datetime, timedelta
 import pytz
 from typing import Dict, List, Optional
 import plotly.express as px
 import plotly.graph_objects as go
 import time
-import random
 from streamlit_pdf_viewer import pdf_viewer
 
 # Import our existing modules
@@ -17,14 +17,36 @@ from ai_recruitment_agent_team import (
     create_resume_analyzer,
     create_email_agent,
     create_scheduler_agent,
-    extract_text_from_pdf,
-    analyze_resume,
+    extract_text_from_pdf_bytes,
+    resume_text_digest,
+    AnalysisStream,
+    openrouter_health,
+    analyze_resume_multi,
     send_selection_email,
     send_rejection_email,
+    selection_email_prompt,
+    rejection_email_prompt,
     schedule_interview,
     ROLE_REQUIREMENTS,
     sanitize_ascii,
-    openrouter_chat,
+    analyze_resume_batch,
+    extract_email_address,
+    BATCH_MAX_WORKERS,
+    get_email_outbox,
+    get_recruitment_store,
+    export_csv,
+    CANDIDATE_EXPORT_COLUMNS,
+    INTERVIEW_EXPORT_COLUMNS,
+    index_candidate_resume,
+    index_candidate_search,
+    search_candidates,
+    index_candidate_similarity,
+    similar_candidates,
+    score_candidate,
+    top_candidates,
+    rescore_candidates,
+    find_duplicate_candidates,
+    resume_diff,
 )
 
 # Page configuration
@@ -451,11 +473,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def init_data_storage():
-    """Initialize data storage for candidates and interviews"""
-    if 'candidates_data' not in st.session_state:
-        st.session_state.candidates_data = []
-    if 'interviews_data' not in st.session_state:
-        st.session_state.interviews_data = []
+    """Initialize session state; candidates and interviews live in the recruitment store"""
     if 'current_step' not in st.session_state:
         st.session_state.current_step = 1
     if 'email_templates' not in st.session_state:
@@ -521,6 +539,10 @@ Best regards,
         }
     if 'notifications' not in st.session_state:
         st.session_state.notifications = []
+    if 'email_drafts' not in st.session_state:
+        st.session_state.email_drafts = {}
+    if 'saved_candidate_ids' not in st.session_state:
+        st.session_state.saved_candidate_ids = []
 
 def add_notification(message, type='info'):
     """Add a notification to the session state"""
@@ -543,21 +565,85 @@ def show_notifications():
             ''', unsafe_allow_html=True)
 
 def save_candidate_data(candidate_data):
-    """Save candidate data to session state"""
-    st.session_state.candidates_data.append(candidate_data)
+    """Save candidate data to the recruitment store and return it with its id"""
+    score_candidate(candidate_data)
+    candidate_data = get_recruitment_store().add_candidate(candidate_data)
+    index_candidate_resume(candidate_data)
+    index_candidate_search(candidate_data)
+    index_candidate_similarity(candidate_data)
     add_notification(f"Candidate {candidate_data['name']} added successfully!", 'success')
+    return candidate_data
     
 def save_interview_data(interview_data):
-    """Save interview data to session state"""
-    st.session_state.interviews_data.append(interview_data)
+    """Save interview data to the recruitment store and return it with its id"""
+    interview_data = get_recruitment_store().add_interview(interview_data)
     add_notification(f"Interview scheduled for {interview_data['candidate_name']}!", 'success')
+    return interview_data
+
+def get_email_draft(email_agent, candidate_email, role, email_type, feedback="", missing_skills=None,
+                    stream_into=None):
+    """Return the stored email draft, generating it with the LLM only once
+    
+    With `stream_into` (an st.empty() placeholder) a new draft is shown there
+    as it is written, and the placeholder is cleared once it is complete.
+    Drafts are keyed by their inputs, so a new analysis never reuses one
+    written from another candidate's feedback.
+    """
+    content_digest = hashlib.sha256(json.dumps([feedback, missing_skills or []]).encode("utf-8")).hexdigest()
+    key = (email_type, role, candidate_email, content_digest)
+    drafts = st.session_state.email_drafts
+    if key not in drafts:
+        if email_type == 'selection':
+            prompt = selection_email_prompt(candidate_email, role)
+        else:
+            prompt = rejection_email_prompt(candidate_email, role, feedback, missing_skills)
+        if stream_into is not None:
+            with stream_into.container():
+                drafts[key] = st.write_stream(email_agent.draft_stream(prompt))
+            stream_into.empty()
+        else:
+            drafts[key] = email_agent.draft(prompt)
+    return drafts[key]
+
+def mark_email_queued(candidate_email):
+    """Flag the candidate's latest record as having mail in the outbox"""
+    store = get_recruitment_store()
+    latest = store.candidates(email=candidate_email, limit=1, newest_first=True)
+    if latest:
+        store.update_candidate(latest[0]['id'], email_status='queued')
+
+def sync_email_statuses():
+    """Copy outbox delivery status onto candidates with mail still queued"""
+    store = get_recruitment_store()
+    pending = store.candidates(email_status='queued')
+    if not pending:
+        return
+    statuses = get_email_outbox().status_by_recipient(c['email'] for c in pending)
+    for candidate in pending:
+        delivery = statuses.get(candidate['email'])
+        if delivery and delivery['status'] != 'queued':
+            store.update_candidate(candidate['id'], email_status=delivery['status'])
+            if delivery['status'] == 'failed':
+                add_notification(f"Email to {candidate['email']} failed: {delivery['last_error']}", 'error')
+
+def render_similar_candidates(candidate_id, k=5):
+    """Show the candidates whose resumes are most like this one, across all roles"""
+    similar = similar_candidates(candidate_id, k=k)
+    if not similar:
+        st.caption("No similar candidates found yet.")
+        return
+    st.dataframe(pd.DataFrame([{
+        'Name': c['name'],
+        'Email': c['email'],
+        'Role': c['role'].replace('_', ' ').title(),
+        'Status': c['status'],
+        'Score': c.get('score', ''),
+        'Similarity': f"{similarity:.0%}"
+    } for c, similarity in similar]), use_container_width=True, hide_index=True)
 
 def get_candidates_by_status(status=None):
-    """Get candidates filtered by status"""
-    candidates = st.session_state.candidates_data
-    if status:
-        return [c for c in candidates if c.get('status') == status]
-    return candidates
+    """Get candidates filtered by status (indexed lookup)"""
+    return get_recruitment_store().candidates(status=status or None)
 
 def render_step_indicator(current_step, total_steps=4):
     """Render enhanced step indicator"""
@@ -701,37 +787,97 @@ def configuration_page():
             st.button("🚀 Proceed to Candidate Analysis", disabled=True, use_container_width=True)
             st.caption("Please complete required configurations")
 
-def candidate_analysis_page():
-    """Enhanced candidate analysis page"""
-    st.markdown('''
-    <div class="main-header">
-        <h1>👤 Candidate Analysis</h1>
-        <p>Upload resumes and analyze candidates with AI</p>
-    </div>
-    ''', unsafe_allow_html=True)
-    
-    render_step_indicator(2)
-    
-    # Progress bar
-    progress = 0.5
-    st.markdown(f'<div class="progress-bar" style="width: {progress*100}%"></div>', unsafe_allow_html=True)
-    
-    # Role selection with enhanced UI
+def batch_resume_analysis(role):
+    """Analyze many resumes concurrently and stream results into the candidate store"""
     st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-    st.subheader("🎯 Job Position")
-    role = st.selectbox(
-        "Select Role to Recruit For", 
-        ["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
-        format_func=lambda x: x.replace("_", " ").title()
+    st.subheader("📦 Batch Resume Upload")
+    resume_files = st.file_uploader(
+        "Upload Resumes (PDF)",
+        type=["pdf"],
+        accept_multiple_files=True,
+        help="Candidate name is taken from the file name and email from the resume text"
+    )
+    max_workers = st.slider(
+        "Parallel analyses",
+        min_value=1,
+        max_value=BATCH_MAX_WORKERS,
+        value=4,
+        help="Number of resumes analyzed at the same time"
+    )
+    reuse_duplicates = st.checkbox(
+        "♻️ Reuse verdicts for near-duplicate resumes",
+        value=True,
+        help="Resumes nearly identical to one already screened for this role skip the AI analysis"
     )
     
-    # Display role requirements with better formatting
-    with st.expander("📋 Role Requirements", expanded=True):
-        st.markdown(ROLE_REQUIREMENTS[role])
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    st.markdown("---")
+    if resume_files:
+        st.info(f"📊 {len(resume_files)} resumes ready for analysis")
     
+    if st.button("🚀 Analyze All Resumes", type="primary", use_container_width=True):
+        if not resume_files:
+            st.warning("⚠️ Please upload at least one resume")
+        else:
+            analyzer = create_resume_analyzer()
+            if analyzer:
+                total = len(resume_files)
+                # Read uploads on the script thread; workers only see bytes
+                resumes = [(f.name, f.getvalue()) for f in resume_files]
+                
+                progress_bar = st.progress(0.0)
+                col1, col2, col3, col4 = st.columns(4)
+                done_metric, selected_metric, failed_metric, rate_metric = (
+                    col1.empty(), col2.empty(), col3.empty(), col4.empty()
+                )
+                results_log = st.container()
+                
+                done = selected = failed = 0
+                started = time.perf_counter()
+                for result in analyze_resume_batch(resumes, role, analyzer, max_workers=max_workers,
+                                                   reuse_duplicates=reuse_duplicates):
+                    done += 1
+                    name = os.path.splitext(result['label'])[0].replace('_', ' ').title()
+                    
+                    if result['error']:
+                        failed += 1
+                        results_log.error(f"❌ {result['label']}: {result['error']}")
+                    else:
+                        is_selected = result['selected']
+                        selected += int(is_selected)
+                        candidate_data = {
+                            'name': name,
+                            'email': extract_email_address(result['resume_text']),
+                            'role': role,
+                            'resume_text': result['resume_text'],
+                            'status': 'selected' if is_selected else 'rejected',
+                            'feedback': result['feedback'],
+                            'analysis_date': datetime.now().isoformat(),
+                            'matching_skills': result['matching_skills'],
+                            'missing_skills': result['missing_skills'],
+                            'experience_level': result['experience_level'],
+                            'reused_from': result['reused_from']
+                        }
+                        save_candidate_data(candidate_data)
+                        status_icon = "✅" if is_selected else "❌"
+                        reused_note = f" ♻️ reused #{result['reused_from']}" if result['reused_from'] else ""
+                        results_log.markdown(
+                            f"{status_icon} **{name}** ({result['label']}) - {result['elapsed']:.1f}s{reused_note}"
+                        )
+                    
+                    elapsed = time.perf_counter() - started
+                    progress_bar.progress(done / total, text=f"Analyzed {done}/{total} resumes")
+                    done_metric.metric("Completed", f"{done}/{total}")
+                    selected_metric.metric("Selected", selected)
+                    failed_metric.metric("Failed", failed)
+                    rate_metric.metric("Throughput", f"{done / elapsed * 60:.1f}/min" if elapsed > 0 else "-")
+                
+                add_notification(
+                    f"Batch analysis finished: {done - failed} analyzed, {failed} failed",
+                    'success' if not failed else 'error'
+                )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def single_resume_analysis(role):
+    """Upload, analyze and email a single candidate"""
     # Resume upload and analysis with enhanced layout
     col1, col2 = st.columns([1, 1])
 
@@ -750,9 +896,10 @@ def candidate_analysis_page():
             
             # Display the uploaded resume
             st.markdown("### 📄 Resume Preview")
+            resume_bytes = resume_file.getvalue()
             try:
                 # ✅ Convert UploadedFile to bytes before passing to pdf_viewer
-                pdf_viewer(resume_file.read(), width=700, height=500)
+                pdf_viewer(resume_bytes, width=700, height=500)
             except Exception as e:
                 st.warning(f"Could not display PDF preview: {e}")
                 st.info("PDF uploaded but preview not available")
@@ -760,10 +907,15 @@ def candidate_analysis_page():
             
             # Extract text with progress
             with st.spinner("Extracting text from PDF..."):
-                resume_text = extract_text_from_pdf(resume_file)
+                # Memoized by file digest, so reruns don't re-parse the PDF
+                resume_text = extract_text_from_pdf_bytes(resume_bytes)
                 if resume_text:
+                    # Held in the session until a candidate is saved; only saved candidates' text is stored
+                    resume_digest = resume_text_digest(resume_text)
+                    if resume_digest != st.session_state.get('current_resume_digest'):
+                        st.session_state.saved_candidate_ids = []
+                    st.session_state.current_resume_digest = resume_digest
                     st.session_state.current_resume_text = resume_text
-                    st.session_state.current_resume_file = resume_file
                     st.info(f"📊 Extracted {len(resume_text)} characters from resume")
                     
                     # Show extracted text in expander
@@ -797,21 +949,93 @@ def candidate_analysis_page():
     st.subheader("🔍 Resume Analysis")
     
     # Add clear form button
-    if st.session_state.get('current_resume_text') or st.session_state.get('candidate_email'):
+    if st.session_state.get('current_resume_digest') or st.session_state.get('candidate_email'):
         col1, col2 = st.columns([1, 3])
         with col1:
             if st.button("🗑️ Clear Form", use_container_width=True):
+                st.session_state.current_resume_digest = None
                 st.session_state.current_resume_text = ""
                 st.session_state.candidate_email = ""
                 st.session_state.candidate_name = ""
-                st.session_state.current_resume_file = None
                 st.session_state.show_email_preview = False
+                st.session_state.email_drafts = {}
+                st.session_state.saved_candidate_ids = []
                 st.rerun()
         with col2:
             st.info("💡 Form has data. Click 'Clear Form' to start fresh or continue with current data.")
     
+    # Near-duplicate check against resumes already screened for this role
+    if st.session_state.get('current_resume_digest'):
+        resume_text = st.session_state.current_resume_text
+        # Records this upload has already been saved as are not duplicates of it
+        duplicates = [
+            (candidate, similarity) for candidate, similarity in find_duplicate_candidates(resume_text, role)
+            if candidate.id not in st.session_state.saved_candidate_ids
+        ]
+        if duplicates:
+            previous, similarity = duplicates[0]
+            st.warning(
+                f"♻️ This resume is a {similarity:.0%} match for {previous['name']} ({previous['email']}), "
+                f"already {previous['status']} for this role on {previous['analysis_date'][:10]}."
+            )
+            with st.expander("🔍 Compare with previous resume", expanded=False):
+                st.markdown(f"**Previous feedback:** {previous['feedback']}")
+                st.code(resume_diff(previous.resume_text, resume_text) or "No textual differences", language="diff")
+            if st.button("♻️ Reuse Previous Verdict", use_container_width=True):
+                if not candidate_email or not candidate_name:
+                    st.warning("⚠️ Please enter candidate name and email")
+                else:
+                    reused = save_candidate_data({
+                        'name': candidate_name,
+                        'email': candidate_email,
+                        'role': role,
+                        'resume_text': st.session_state.current_resume_text,
+                        'status': previous['status'],
+                        'feedback': previous['feedback'],
+                        'analysis_date': datetime.now().isoformat(),
+                        'matching_skills': previous.get('matching_skills', []),
+                        'missing_skills': previous.get('missing_skills', []),
+                        'experience_level': previous.get('experience_level'),
+                        'reused_from': previous['id']
+                    })
+                    st.session_state.saved_candidate_ids.append(reused['id'])
+                    st.success(f"✅ Reused verdict from {previous['name']}: {previous['status'].title()}")
+    
+    if st.button("🧭 Compare Fit Across All Roles", use_container_width=True,
+                 help="One AI call evaluates the resume against every role"):
+        if not st.session_state.get('current_resume_digest'):
+            st.warning("⚠️ Please upload a resume first")
+        else:
+            with st.spinner("🤖 Evaluating the resume against every role..."):
+                try:
+                    resume_text = st.session_state.current_resume_text
+                    role_results = analyze_resume_multi(resume_text, create_resume_analyzer())
+                    fit_rows = []
+                    for fit_role, result in role_results.items():
+                        skill_score = score_candidate({
+                            'role': fit_role,
+                            'resume_text': resume_text,
+                            'matching_skills': result['matching_skills'],
+                            'missing_skills': result['missing_skills']
+                        })
+                        fit_rows.append({
+                            'Role': fit_role.replace('_', ' ').title(),
+                            'Verdict': "✅ Selected" if result['selected'] else "❌ Rejected",
+                            'AI Fit': result.get('fit_score'),
+                            'Skill Score': skill_score,
+                            'Missing Skills': ", ".join(result['missing_skills'])
+                        })
+                    # Best fit first: selected roles, then model fit, then skill coverage
+                    fit_rows.sort(key=lambda r: (r['Verdict'].startswith("✅"), r['AI Fit'] or 0, r['Skill Score']),
+                                  reverse=True)
+                    st.dataframe(pd.DataFrame(fit_rows), use_container_width=True, hide_index=True)
+                    st.success(f"🧭 Best fit: {fit_rows[0]['Role']}")
+                    st.caption("Analyzing this resume for any of these roles now reuses the verdict above.")
+                except Exception as e:
+                    st.error(f"❌ Error comparing roles: {str(e)}")
+    
     if st.button("🚀 Analyze Resume", type="primary", use_container_width=True):
-        if not st.session_state.get('current_resume_text'):
+        if not st.session_state.get('current_resume_digest'):
             st.warning("⚠️ Please upload a resume first")
         elif not candidate_email:
             st.warning("⚠️ Please enter candidate email")
@@ -821,44 +1045,75 @@ def candidate_analysis_page():
             with st.spinner("🤖 AI is analyzing the resume..."):
                 try:
                     analyzer = create_resume_analyzer()
-                    email_agent = create_email_agent()
+                    email_agent = create_email_agent(queued=True)
+                    
+                    resume_text = st.session_state.current_resume_text
                     
-                    is_selected, feedback = analyze_resume(
-                        st.session_state.current_resume_text, 
+                    st.markdown("### 📊 Analysis Results")
+                    st.markdown("### 💬 Feedback")
+                    
+                    # Show the feedback as the model writes it; the full reply is parsed once it ends
+                    feedback_box = st.empty()
+                    analysis_stream = AnalysisStream(
+                        resume_text, 
                         role, 
                         analyzer
                     )
+                    with feedback_box.container():
+                        st.write_stream(analysis_stream)
+                    analysis = analysis_stream.result
+                    if analysis.get('error'):
+                        # Unparseable reply: report it instead of saving a rejection
+                        raise ValueError(analysis['error'])
+                    is_selected, feedback = analysis['selected'], analysis['feedback']
+                    feedback_box.info(feedback)
+                    missing_skills = analysis['missing_skills']
                     
                     # Create candidate data with enhanced fields
                     candidate_data = {
-                        'id': len(st.session_state.candidates_data) + 1,
                         'name': candidate_name,
                         'email': candidate_email,
                         'role': role,
-                        'resume_text': st.session_state.current_resume_text,
+                        # The store writes the text out of line when the record is added
+                        'resume_text': resume_text,
                         'status': 'selected' if is_selected else 'rejected',
                         'feedback': feedback,
                         'analysis_date': datetime.now().isoformat(),
-                        'matching_skills': [],  # Could be extracted from analysis
-                        'missing_skills': [],   # Could be extracted from analysis
-                        'score': random.randint(60, 95) if is_selected else random.randint(20, 60)
+                        'matching_skills': analysis['matching_skills'],
+                        'missing_skills': missing_skills,
+                        'experience_level': analysis['experience_level']
                     }
                     
                     # Save candidate data
-                    save_candidate_data(candidate_data)
+                    candidate_data = save_candidate_data(candidate_data)
+                    st.session_state.saved_candidate_ids.append(candidate_data['id'])
                     
                     # Display results with enhanced UI
-                    st.markdown("### 📊 Analysis Results")
-                    
                     status_class = "status-selected" if is_selected else "status-rejected"
                     status_text = "SELECTED" if is_selected else "REJECTED"
                     st.markdown(f'<div class="status-badge {status_class}">{status_text}</div>', unsafe_allow_html=True)
                     
                     # Show score
-                    st.metric("AI Score", f"{candidate_data['score']}/100")
+                    st.metric("Skill Score", f"{candidate_data['score']}/100",
+                              help="Weighted coverage of the role's required skills")
                     
-                    st.markdown("### 💬 Feedback")
-                    st.info(feedback)
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown("**✅ Matching skills**")
+                        st.markdown(", ".join(analysis['matching_skills']) or "_None identified_")
+                    with col2:
+                        st.markdown("**📚 Missing skills**")
+                        st.markdown(", ".join(missing_skills) or "_None identified_")
+                    if analysis['experience_level']:
+                        st.caption(f"Experience level: {analysis['experience_level'].title()}")
+                    if analysis.get('prescreened'):
+                        st.caption("Screened out locally by skill coverage; no AI call was made.")
+                    elif analysis.get('compression'):
+                        report = analysis['compression']
+                        st.caption(
+                            f"Prompt resume: ~{report['compressed_tokens']} tokens "
+                            f"(~{report['tokens_saved']} saved of {report['original_tokens']})"
+                        )
                     
                     # Email Action Section
                     st.markdown("### 📧 Email Actions")
@@ -871,12 +1126,14 @@ def candidate_analysis_page():
                         
                         with col1:
                             if st.button("📧 Send Selection Email", type="primary", use_container_width=True):
-                                with st.spinner("Sending email..."):
+                                with st.spinner("Queueing email..."):
                                     try:
-                                        send_selection_email(email_agent, candidate_email, role)
-                                        st.success(f"✅ Selection email sent to {candidate_email}")
+                                        draft = get_email_draft(email_agent, candidate_email, role, 'selection')
+                                        send_selection_email(email_agent, candidate_email, role, draft=draft)
+                                        mark_email_queued(candidate_email)
+                                        st.success(f"📤 Selection email queued for {candidate_email}")
                                         st.balloons()
-                                        add_notification(f"Selection email sent to {candidate_email}!", 'success')
+                                        add_notification(f"Selection email queued for {candidate_email}!", 'success')
                                     except Exception as e:
                                         st.error(f"❌ Failed to send email: {str(e)}")
                                         add_notification(f"Failed to send email: {str(e)}", 'error')
@@ -897,17 +1154,10 @@ def candidate_analysis_page():
                             st.markdown("---")
                             st.markdown("### 📧 Email Preview")
                             
-                            # Generate email preview (no send)
+                            # Draft once and reuse on reruns and on send
                             try:
-                                email_prompt = (
-                                    f"Send an email to {candidate_email} about selection for the {role} "
-                                    f"position. Congratulate them and mention next steps. Include company name: "
-                                    f"{st.session_state.company_name}."
-                                )
-                                email_content = openrouter_chat(
-                                    messages=[{"role": "user", "content": email_prompt}],
-                                    api_key=st.session_state.openai_api_key,
-                                )
+                                email_content = get_email_draft(email_agent, candidate_email, role, 'selection',
+                                                                stream_into=st.empty())
                                 
                                 # Display the preview
                                 st.markdown('<div class="email-preview">', unsafe_allow_html=True)
@@ -918,12 +1168,13 @@ def candidate_analysis_page():
                                 col1, col2 = st.columns(2)
                                 with col1:
                                     if st.button("✅ Send This Email", type="primary", use_container_width=True):
-                                        with st.spinner("Sending email..."):
+                                        with st.spinner("Queueing email..."):
                                             try:
-                                                send_selection_email(email_agent, candidate_email, role)
-                                                st.success(f"✅ Selection email sent to {candidate_email}")
+                                                send_selection_email(email_agent, candidate_email, role, draft=email_content)
+                                                mark_email_queued(candidate_email)
+                                                st.success(f"📤 Selection email queued for {candidate_email}")
                                                 st.balloons()
-                                                add_notification(f"Selection email sent to {candidate_email}!", 'success')
+                                                add_notification(f"Selection email queued for {candidate_email}!", 'success')
                                                 st.session_state.show_email_preview = False
                                                 st.rerun()
                                             except Exception as e:
@@ -947,11 +1198,14 @@ def candidate_analysis_page():
                         
                         with col1:
                             if st.button("📧 Send Rejection Email", type="secondary", use_container_width=True):
-                                with st.spinner("Sending email..."):
+                                with st.spinner("Queueing email..."):
                                     try:
-                                        send_rejection_email(email_agent, candidate_email, role, feedback)
-                                        st.success(f"✅ Rejection email sent to {candidate_email}")
-                                        add_notification(f"Rejection email sent to {candidate_email}!", 'success')
+                                        draft = get_email_draft(email_agent, candidate_email, role, 'rejection',
+                                                                feedback, missing_skills)
+                                        send_rejection_email(email_agent, candidate_email, role, feedback, draft=draft)
+                                        mark_email_queued(candidate_email)
+                                        st.success(f"📤 Rejection email queued for {candidate_email}")
+                                        add_notification(f"Rejection email queued for {candidate_email}!", 'success')
                                     except Exception as e:
                                         st.error(f"❌ Failed to send email: {str(e)}")
                                         add_notification(f"Failed to send email: {str(e)}", 'error')
@@ -967,18 +1221,10 @@ def candidate_analysis_page():
                             st.markdown("---")
                             st.markdown("### 📧 Email Preview")
                             
-                            # Generate rejection email preview (no send)
+                            # Draft once and reuse on reruns and on send
                             try:
-                                email_prompt = (
-                                    f"send an email to {candidate_email} regarding the {role} application. "
-                                    f"Use all lowercase, be empathetic and human. Mention feedback: {feedback}. "
-                                    f"Encourage upskilling and retry. Suggest learning resources based on missing "
-                                    f"skills. End with exactly:\nbest,\nthe ai recruiting team"
-                                )
-                                email_content = openrouter_chat(
-                                    messages=[{"role": "user", "content": email_prompt}],
-                                    api_key=st.session_state.openai_api_key,
-                                )
+                                email_content = get_email_draft(email_agent, candidate_email, role, 'rejection',
+                                                                feedback, missing_skills, stream_into=st.empty())
                                 
                                 # Display the preview
                                 st.markdown('<div class="email-preview">', unsafe_allow_html=True)
@@ -989,11 +1235,12 @@ def candidate_analysis_page():
                                 col1, col2 = st.columns(2)
                                 with col1:
                                     if st.button("✅ Send This Email", type="secondary", use_container_width=True):
-                                        with st.spinner("Sending email..."):
+                                        with st.spinner("Queueing email..."):
                                             try:
-                                                send_rejection_email(email_agent, candidate_email, role, feedback)
-                                                st.success(f"✅ Rejection email sent to {candidate_email}")
-                                                add_notification(f"Rejection email sent to {candidate_email}!", 'success')
+                                                send_rejection_email(email_agent, candidate_email, role, feedback, draft=email_content)
+                                                mark_email_queued(candidate_email)
+                                                st.success(f"📤 Rejection email queued for {candidate_email}")
+                                                add_notification(f"Rejection email queued for {candidate_email}!", 'success')
                                                 st.session_state.show_email_preview = False
                                                 st.rerun()
                                             except Exception as e:
@@ -1016,11 +1263,13 @@ def candidate_analysis_page():
                         with col1:
                             if st.button("🔄 Analyze Another Resume", use_container_width=True):
                                 # Clear form
+                                st.session_state.current_resume_digest = None
                                 st.session_state.current_resume_text = ""
                                 st.session_state.candidate_email = ""
                                 st.session_state.candidate_name = ""
-                                st.session_state.current_resume_file = None
                                 st.session_state.show_email_preview = False
+                                st.session_state.email_drafts = {}
+                                st.session_state.saved_candidate_ids = []
                                 st.rerun()
                         
                         with col2:
@@ -1035,13 +1284,58 @@ def candidate_analysis_page():
                     add_notification(f"Analysis failed: {str(e)}", 'error')
     
     st.markdown('</div>', unsafe_allow_html=True)
+
+def candidate_analysis_page():
+    """Enhanced candidate analysis page"""
+    st.markdown('''
+    <div class="main-header">
+        <h1>👤 Candidate Analysis</h1>
+        <p>Upload resumes and analyze candidates with AI</p>
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    render_step_indicator(2)
+    
+    # Progress bar
+    progress = 0.5
+    st.markdown(f'<div class="progress-bar" style="width: {progress*100}%"></div>', unsafe_allow_html=True)
+    
+    # Role selection with enhanced UI
+    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+    st.subheader("🎯 Job Position")
+    role = st.selectbox(
+        "Select Role to Recruit For", 
+        ["ai_ml_engineer", "frontend_engineer", "backend_engineer"],
+        format_func=lambda x: x.replace("_", " ").title()
+    )
+    
+    # Display role requirements with better formatting
+    with st.expander("📋 Role Requirements", expanded=True):
+        st.markdown(ROLE_REQUIREMENTS[role])
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    analysis_mode = st.radio(
+        "Analysis Mode",
+        ["single", "batch"],
+        format_func=lambda x: "📄 Single Resume" if x == "single" else "📦 Batch Upload",
+        horizontal=True,
+        help="Batch mode analyzes many resumes concurrently"
+    )
+    
+    st.markdown("---")
+    
+    if analysis_mode == "batch":
+        batch_resume_analysis(role)
+    else:
+        single_resume_analysis(role)
     
     # Recent candidates with enhanced cards
-    if st.session_state.candidates_data:
+    recent_candidates = get_recruitment_store().candidates(limit=3, newest_first=True)
+    if recent_candidates:
         st.markdown("---")
         st.subheader("📋 Recent Candidates")
         
-        for candidate in st.session_state.candidates_data[-3:]:  # Show last 3
+        for candidate in reversed(recent_candidates):  # Show last 3
             with st.container():
                 status_icon = "✅" if candidate['status'] == 'selected' else "❌"
                 st.markdown(f'''
@@ -1051,6 +1345,7 @@ def candidate_analysis_page():
                     <p><strong>Role:</strong> {candidate['role'].replace('_', ' ').title()}</p>
                     <p><strong>Status:</strong> {candidate['status'].title()}</p>
                     <p><strong>Score:</strong> {candidate.get('score', 'N/A')}/100</p>
+                    <p><strong>Email:</strong> {candidate.get('email_status', 'not sent').title()}</p>
                     <p><strong>Date:</strong> {candidate['analysis_date'][:10]}</p>
                 </div>
                 ''', unsafe_allow_html=True)
@@ -1121,6 +1416,9 @@ def interview_scheduling_page():
                     st.session_state.selected_candidate = candidate
                     st.session_state.scheduling_step = 'email_template'
                     st.rerun()
+            
+            if st.checkbox("🔗 Show similar candidates", key=f"similar_{candidate['id']}"):
+                render_similar_candidates(candidate['id'])
     
     # Email template selection and preview
     if 'selected_candidate' in st.session_state and 'scheduling_step' in st.session_state:
@@ -1258,15 +1556,17 @@ def interview_scheduling_page():
                     with st.spinner("Scheduling interview and sending email..."):
                         try:
                             scheduler = create_scheduler_agent()
-                            email_agent = create_email_agent()
+                            email_agent = create_email_agent(queued=True)
                             
-                            # Schedule interview
-                            schedule_interview(
+                            # Schedule interview; the record is only marked once mail is in the outbox
+                            outbox_id = schedule_interview(
                                 scheduler, 
                                 candidate['email'], 
                                 email_agent, 
                                 candidate['role']
                             )
+                            if outbox_id is not None:
+                                mark_email_queued(candidate['email'])
                             
                             # Save interview data
                             interview_data = {
@@ -1299,11 +1599,12 @@ def interview_scheduling_page():
                     st.rerun()
     
     # Scheduled interviews with enhanced display
-    if st.session_state.interviews_data:
+    interviews = get_recruitment_store().interviews()
+    if interviews:
         st.markdown("---")
         st.subheader("📋 Scheduled Interviews")
         
-        interviews_df = pd.DataFrame(st.session_state.interviews_data)
+        interviews_df = pd.DataFrame([interview.to_dict() for interview in interviews])
         
         if not interviews_df.empty:
             # Enhanced dataframe display
@@ -1326,6 +1627,54 @@ def interview_scheduling_page():
             st.session_state.current_step = 4
             st.rerun()
 
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_top_candidates(data_version, role, k, status):
+    """Shortlist once per candidate store data version, so reruns skip the full scoring scan"""
+    return top_candidates(role, k=k, status=status)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def build_dashboard_figures(data_version, _status_counts, _role_counts):
+    """Build the dashboard charts once per candidate store data version"""
+    # Status distribution pie chart with enhanced styling
+    status_data = {
+        'Selected': _status_counts.get('selected', 0),
+        'Rejected': _status_counts.get('rejected', 0)
+    }
+    
+    fig_pie = px.pie(
+        values=list(status_data.values()),
+        names=list(status_data.keys()),
+        title="Candidate Status Distribution",
+        color_discrete_map={'Selected': '#28a745', 'Rejected': '#dc3545'},
+        hole=0.3
+    )
+    fig_pie.update_layout(
+        font=dict(family="Inter", size=12),
+        title_font=dict(size=16, family="Inter")
+    )
+    
+    # Role distribution with enhanced styling
+    role_data = {
+        role.replace('_', ' ').title(): count
+        for role, count in _role_counts.items()
+    }
+    
+    fig_bar = None
+    if role_data:
+        fig_bar = px.bar(
+            x=list(role_data.keys()),
+            y=list(role_data.values()),
+            title="Candidates by Role",
+            labels={'x': 'Role', 'y': 'Count'},
+            color=list(role_data.values()),
+            color_continuous_scale='viridis'
+        )
+        fig_bar.update_layout(
+            font=dict(family="Inter", size=12),
+            title_font=dict(size=16, family="Inter")
+        )
+    return fig_pie, fig_bar
+
 def dashboard_page():
     """Enhanced dashboard page with advanced analytics"""
     st.markdown('''
@@ -1342,10 +1691,11 @@ def dashboard_page():
     st.markdown(f'<div class="progress-bar" style="width: {progress*100}%"></div>', unsafe_allow_html=True)
     
     # Statistics with enhanced metrics
-    total_candidates = len(st.session_state.candidates_data)
-    selected_candidates = len(get_candidates_by_status('selected'))
-    rejected_candidates = len(get_candidates_by_status('rejected'))
-    scheduled_interviews = len(st.session_state.interviews_data)
+    store = get_recruitment_store()
+    total_candidates = store.count_candidates()
+    selected_candidates = store.count_candidates(status='selected')
+    rejected_candidates = store.count_candidates(status='rejected')
+    scheduled_interviews = store.count_interviews()
     
     # Enhanced metrics display
     col1, col2, col3, col4 = st.columns(4)
@@ -1388,61 +1738,147 @@ def dashboard_page():
     
     # Enhanced charts
     if total_candidates > 0:
+        data_version, status_counts, role_counts = store.counts_snapshot()
+        fig_pie, fig_bar = build_dashboard_figures(data_version, status_counts, role_counts)
         col1, col2 = st.columns(2)
         
         with col1:
-            # Status distribution pie chart with enhanced styling
-            status_data = {
-                'Selected': selected_candidates,
-                'Rejected': rejected_candidates
-            }
-            
-            fig_pie = px.pie(
-                values=list(status_data.values()),
-                names=list(status_data.keys()),
-                title="Candidate Status Distribution",
-                color_discrete_map={'Selected': '#28a745', 'Rejected': '#dc3545'},
-                hole=0.3
-            )
-            fig_pie.update_layout(
-                font=dict(family="Inter", size=12),
-                title_font=dict(size=16, family="Inter")
-            )
             st.plotly_chart(fig_pie, use_container_width=True)
         
         with col2:
-            # Role distribution with enhanced styling
-            role_data = {}
-            for candidate in st.session_state.candidates_data:
-                role = candidate['role'].replace('_', ' ').title()
-                role_data[role] = role_data.get(role, 0) + 1
-            
-            if role_data:
-                fig_bar = px.bar(
-                    x=list(role_data.keys()),
-                    y=list(role_data.values()),
-                    title="Candidates by Role",
-                    labels={'x': 'Role', 'y': 'Count'},
-                    color=list(role_data.values()),
-                    color_continuous_scale='viridis'
-                )
-                fig_bar.update_layout(
-                    font=dict(family="Inter", size=12),
-                    title_font=dict(size=16, family="Inter")
-                )
+            if fig_bar is not None:
                 st.plotly_chart(fig_bar, use_container_width=True)
     
+    # Shortlist ranked by the skill scoring engine
+    st.markdown("---")
+    st.subheader("🏆 Top Candidates")
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        rank_role = st.selectbox(
+            "Rank role",
+            list(ROLE_REQUIREMENTS.keys()),
+            format_func=lambda r: r.replace('_', ' ').title(),
+            key="rank_role"
+        )
+    with col2:
+        rank_k = st.number_input("Shortlist size", min_value=1, max_value=100, value=10, step=1)
+    with col3:
+        selected_only = st.checkbox("Selected only", value=False)
+    
+    shortlist = cached_top_candidates(store.data_version, rank_role, int(rank_k),
+                                      'selected' if selected_only else None)
+    if shortlist:
+        st.dataframe(pd.DataFrame([{
+            'Rank': rank,
+            'Name': c['name'],
+            'Email': c['email'],
+            'Score': score,
+            'Status': c['status'],
+            'Experience': c.get('experience_level', '')
+        } for rank, (c, score) in enumerate(shortlist, 1)]), use_container_width=True, hide_index=True)
+        if st.button("🔄 Rescore stored candidates", help="Write current scores back to every candidate for this role"):
+            with st.spinner("Rescoring..."):
+                rescored = rescore_candidates(rank_role)
+            st.success(f"✅ Rescored {rescored} candidates")
+        
+        st.markdown("#### 🔗 Similar Candidates")
+        shortlist_by_id = {c['id']: c for c, _ in shortlist}
+        lookalike_of = st.selectbox(
+            "Find look-alikes of",
+            list(shortlist_by_id),
+            format_func=lambda cid: f"{shortlist_by_id[cid]['name']} ({shortlist_by_id[cid]['email']})",
+            key="lookalike_of"
+        )
+        render_similar_candidates(lookalike_of)
+    else:
+        st.info("No candidates for this role yet.")
+    
+    # Skill gaps and skill lookup, from the skills saved with each analysis
+    st.markdown("---")
+    st.subheader("🧩 Skill Gaps")
+    
+    gap_role = st.selectbox(
+        "Role",
+        [None] + list(ROLE_REQUIREMENTS.keys()),
+        format_func=lambda r: "All roles" if r is None else r.replace('_', ' ').title(),
+        key="skill_gap_role"
+    )
+    skill_gaps = store.skill_counts('missing', role=gap_role, limit=10)
+    if skill_gaps:
+        fig_gaps = px.bar(
+            x=[count for _, count in skill_gaps],
+            y=[skill for skill, _ in skill_gaps],
+            orientation='h',
+            title="Most Common Missing Skills",
+            labels={'x': 'Candidates', 'y': 'Skill'}
+        )
+        fig_gaps.update_layout(
+            font=dict(family="Inter", size=12),
+            title_font=dict(size=16, family="Inter"),
+            yaxis=dict(autorange="reversed")
+        )
+        st.plotly_chart(fig_gaps, use_container_width=True)
+    else:
+        st.info("No skill data yet. Analyzed candidates will show their missing skills here.")
+    
+    skill_query = st.text_input("🔎 Find candidates with skill", placeholder="e.g. Kubernetes")
+    if skill_query:
+        matches = store.candidates(skill=skill_query, role=gap_role, limit=50, newest_first=True)
+        if matches:
+            st.dataframe(pd.DataFrame([{
+                'Name': c['name'],
+                'Email': c['email'],
+                'Role': c['role'].replace('_', ' ').title(),
+                'Status': c['status'],
+                'Experience': c.get('experience_level', ''),
+                'Matching Skills': ", ".join(c.get('matching_skills', []))
+            } for c in matches]), use_container_width=True)
+        else:
+            st.info(f"No candidates list '{skill_query}' among their matching skills.")
+    
+    # Full-text search over resumes, feedback and skills
+    st.markdown("---")
+    st.subheader("🔎 Search Candidates")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_query = st.text_input(
+            "Search resumes, feedback and skills",
+            placeholder="e.g. kubernetes AND pytorch, react OR vue, python -java",
+            help="Words are AND-ed; use OR between alternatives and NOT or - to exclude a term"
+        )
+    with col2:
+        search_role = st.selectbox(
+            "Role filter",
+            [None] + list(ROLE_REQUIREMENTS.keys()),
+            format_func=lambda r: "All roles" if r is None else r.replace('_', ' ').title(),
+            key="search_role"
+        )
+    if search_query:
+        started = time.perf_counter()
+        search_results = search_candidates(search_query, role=search_role, limit=25)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if search_results:
+            st.caption(f"{len(search_results)} results in {elapsed_ms:.0f} ms")
+            st.dataframe(pd.DataFrame([{
+                'Name': c['name'],
+                'Email': c['email'],
+                'Role': c['role'].replace('_', ' ').title(),
+                'Status': c['status'],
+                'Score': c.get('score', ''),
+                'Relevance': round(relevance, 2)
+            } for c, relevance in search_results]), use_container_width=True, hide_index=True)
+        else:
+            st.info("No candidates match this search.")
+    
     # Recent activity with enhanced display
     st.markdown("---")
     st.subheader("📈 Recent Activity")
     
-    if st.session_state.candidates_data:
+    recent_candidates = store.candidates(limit=5, newest_first=True)
+    if recent_candidates:
         # Create a timeline of recent candidates
-        recent_candidates = sorted(
-            st.session_state.candidates_data, 
-            key=lambda x: x['analysis_date'], 
-            reverse=True
-        )[:5]
         
         for candidate in recent_candidates:
             status_icon = "✅" if candidate['status'] == 'selected' else "❌"
@@ -1460,32 +1896,41 @@ def dashboard_page():
     st.markdown("---")
     st.subheader("📤 Export Data")
     
+    with st.expander("⚙️ Export Options"):
+        export_columns = st.multiselect(
+            "Candidate columns",
+            list(CANDIDATE_EXPORT_COLUMNS) + ['resume_text'],
+            default=list(CANDIDATE_EXPORT_COLUMNS),
+            help="Full resume text is large; include it only when needed"
+        )
+        compress_export = st.checkbox("Compress with gzip", value=False)
+    
+    csv_ext, csv_mime = (".csv.gz", "application/gzip") if compress_export else (".csv", "text/csv")
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("📊 Export Candidates", use_container_width=True):
-            if st.session_state.candidates_data:
-                df = pd.DataFrame(st.session_state.candidates_data)
-                csv = df.to_csv(index=False)
+            if total_candidates and export_columns:
                 st.download_button(
                     label="Download CSV",
-                    data=csv,
-                    file_name=f"candidates_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
+                    data=export_csv(store.iter_candidates(), export_columns, compress=compress_export),
+                    file_name=f"candidates_{datetime.now().strftime('%Y%m%d')}{csv_ext}",
+                    mime=csv_mime
                 )
+            elif not export_columns:
+                st.warning("Select at least one column to export")
             else:
                 st.warning("No candidate data to export")
     
     with col2:
         if st.button("📅 Export Interviews", use_container_width=True):
-            if st.session_state.interviews_data:
-                df = pd.DataFrame(st.session_state.interviews_data)
-                csv = df.to_csv(index=False)
+            if scheduled_interviews:
                 st.download_button(
                     label="Download CSV",
-                    data=csv,
-                    file_name=f"interviews_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
+                    data=export_csv(store.iter_interviews(), INTERVIEW_EXPORT_COLUMNS, compress=compress_export),
+                    file_name=f"interviews_{datetime.now().strftime('%Y%m%d')}{csv_ext}",
+                    mime=csv_mime
                 )
             else:
                 st.warning("No interview data to export")
@@ -1541,6 +1986,7 @@ def main():
     # Initialize session state
     init_session_state()
     init_data_storage()
+    sync_email_statuses()
     
     # Sidebar navigation with enhanced stats
     with st.sidebar:
@@ -1548,13 +1994,14 @@ def main():
         st.markdown("---")
         
         # Quick stats in sidebar
-        if st.session_state.candidates_data:
+        store = get_recruitment_store()
+        total = store.count_candidates()
+        if total:
             st.markdown('<div class="sidebar-stats">', unsafe_allow_html=True)
             st.markdown('<h4>📊 Quick Stats</h4>', unsafe_allow_html=True)
             
-            total = len(st.session_state.candidates_data)
-            selected = len(get_candidates_by_status('selected'))
-            interviews = len(st.session_state.interviews_data)
+            selected = store.count_candidates(status='selected')
+            interviews = store.count_interviews()
             
             st.markdown(f'''
             <div class="stat-item">
@@ -1572,6 +2019,12 @@ def main():
             ''', unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # Only worth a line when OpenRouter is failing
+        health = openrouter_health()
+        if health['breaker'] != 'closed':
+            st.warning(f"⚠️ AI provider unavailable ({health['consecutive_failures']} failures); "
+                       f"requests are paused briefly")
+        
         st.markdown("---")
         
         # Navigation buttons
@@ -0,0 +1,39 @@
+"""Page-by-page PDF text extraction, shared by the app and its process pool.
+
+Pool children import only this module (and PyPDF2), never the Streamlit app
+or the agent libraries; ai_recruitment_agent_team owns the pool itself.
+"""
+
+import io
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+def iter_pdf_pages(pdf_file, max_pages: Optional[int] = None, max_chars: Optional[int] = None,
+                   start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str, float]]:
+    """Yield (page_index, text, seconds) for pages [start, stop), stopping at the cut-offs.
+
+    `max_chars` is the character budget for the pages yielded here; the page
+    that crosses it is cut short and no further pages are parsed.
+    """
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    total_chars = 0
+    stop = len(pdf_reader.pages) if stop is None else min(stop, len(pdf_reader.pages))
+    if max_pages is not None:
+        stop = min(stop, max_pages)
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = pdf_reader.pages[index].extract_text() or ""
+        elapsed = time.perf_counter() - started
+        if max_chars is not None and total_chars + len(text) > max_chars:
+            text = text[:max_chars - total_chars]
+        total_chars += len(text)
+        yield index, text, elapsed
+        if max_chars is not None and total_chars >= max_chars:
+            break
+
+def extract_pdf_page_range(pdf_bytes: bytes, start: int, stop: Optional[int] = None,
+                           max_chars: Optional[int] = None) -> List[Tuple[int, str, float]]:
+    """Pool task: the iter_pdf_pages tuples for pages [start, stop). Only plain tuples go back."""
+    return list(iter_pdf_pages(io.BytesIO(pdf_bytes), max_chars=max_chars, start=start, stop=stop))
@@ -0,0 +1,129 @@
+"""Token-budgeted compression of extracted resume text for analysis prompts.
+
+Kept free of Streamlit and agent imports so it can be used (and tested) on
+its own; ai_recruitment_agent_team re-exports it.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+# Per-call token budget for the resume part of an analysis prompt; 0 disables truncation
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = 4
+
+# PDF extraction separates pages with a form feed, so page furniture can be told apart
+PAGE_BREAK = "\f"
+# Lines at the top or bottom of a page that may be a running header or footer
+PAGE_EDGE_LINES = 3
+
+# Sections that rarely change a screening decision; dropped first when over budget
+LOW_VALUE_SECTIONS = ("references", "hobbies", "interests", "hobbies and interests", "personal details",
+                      "personal information", "personal profile", "declaration", "extracurricular activities",
+                      "activities", "volunteering", "volunteer experience", "strengths")
+
+_PAGE_LABEL_RE = re.compile(r"^page\s*\d{1,3}(\s*(of|/)\s*\d{1,3})?$", re.IGNORECASE)
+# A bare "3" or "3 / 5" only counts as a page number at the top or bottom of a page
+_BARE_PAGE_NUMBER_RE = re.compile(r"^\d{1,3}(\s*(of|/)\s*\d{1,3})?$", re.IGNORECASE)
+_CONTACT_PART_RE = re.compile(
+    r"^([\w.+-]+@[\w-]+\.[\w.-]+|(https?://|www\.)\S+|(linkedin|github)\.com/\S*)$", re.IGNORECASE
+)
+_PHONE_RE = re.compile(r"^\+?[\d\s().-]+$")
+_YEAR_RANGE_RE = re.compile(r"^(19|20)\d{2}\s*[-/]\s*(19|20)\d{2}$")
+_SECTION_HEADING_RE = re.compile(r"^[A-Za-z][A-Za-z &/]{2,40}:?$")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English prose)."""
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+def _is_heading(line: str) -> bool:
+    return bool(_SECTION_HEADING_RE.match(line)) and (line.isupper() or line.endswith(":") or len(line.split()) <= 3)
+
+def _is_phone(part: str) -> bool:
+    return (bool(_PHONE_RE.match(part)) and sum(c.isdigit() for c in part) >= 7
+            and not _YEAR_RANGE_RE.match(part.strip()))
+
+def _is_contact_only(line: str) -> bool:
+    """True for lines made up only of emails, profile URLs and phone numbers."""
+    parts = [p.strip() for p in re.split(r"[|•·,;]", line) if p.strip()]
+    return bool(parts) and all(_CONTACT_PART_RE.match(p) or _is_phone(p) for p in parts)
+
+def _page_furniture(pages: List[List[str]]) -> Set[Tuple[int, int]]:
+    """(page, line) positions of page numbers and headers/footers repeated across pages."""
+    edges = [
+        set(range(min(PAGE_EDGE_LINES, len(page)))) | set(range(max(0, len(page) - PAGE_EDGE_LINES), len(page)))
+        for page in pages
+    ]
+    pages_with_line: Dict[str, Set[int]] = {}
+    for p, page in enumerate(pages):
+        for i in edges[p]:
+            pages_with_line.setdefault(page[i].lower(), set()).add(p)
+    furniture = set()
+    for p, page in enumerate(pages):
+        for i in edges[p]:
+            line = page[i]
+            if _PAGE_LABEL_RE.match(line) or _BARE_PAGE_NUMBER_RE.match(line):
+                furniture.add((p, i))
+            elif len(pages_with_line[line.lower()]) >= 2 and min(pages_with_line[line.lower()]) != p:
+                # Running header/footer: keep it on the first page it appears on
+                furniture.add((p, i))
+    return furniture
+
+def _rewrap(lines: List[str]) -> List[str]:
+    """Rejoin PyPDF2 line wraps: a line not ending a sentence followed by a lower-case continuation."""
+    merged: List[str] = []
+    for line in lines:
+        if merged and merged[-1].endswith("-") and line[:1].islower():
+            merged[-1] = merged[-1][:-1] + line
+        elif merged and line[:1].islower() and not merged[-1].endswith((".", ":", ";")) \
+                and not _is_heading(merged[-1]):
+            merged[-1] += " " + line
+        else:
+            merged.append(line)
+    return merged
+
+def compress_resume_text(text: str, token_budget: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+    """Shrink extracted resume text for prompting; returns (text, report).
+
+    Whitespace is always collapsed and wrapped lines rejoined. Only when the
+    result is still over budget are page numbers, running headers/footers
+    and contact-only lines dropped, then low-value sections, and finally the
+    tail is cut. The report holds original_tokens, compressed_tokens and
+    tokens_saved.
+    """
+    token_budget = RESUME_TOKEN_BUDGET if token_budget is None else token_budget
+    over_budget = lambda s: token_budget > 0 and estimate_tokens(s) > token_budget
+    pages = [
+        [line for line in (" ".join(raw.split()) for raw in page.splitlines()) if line]
+        for page in (text or "").split(PAGE_BREAK)
+    ]
+
+    lines = _rewrap([line for page in pages for line in page])
+    if over_budget("\n".join(lines)):
+        furniture = _page_furniture(pages) if len(pages) > 1 else set()
+        lines = _rewrap([
+            line for p, page in enumerate(pages) for i, line in enumerate(page)
+            if (p, i) not in furniture and not _PAGE_LABEL_RE.match(line) and not _is_contact_only(line)
+        ])
+
+    # Split into (heading, lines) sections so whole low-value sections can go
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in lines:
+        if _is_heading(line):
+            sections.append((line.rstrip(":").strip().lower(), [line]))
+        else:
+            sections[-1][1].append(line)
+
+    def render(parts: List[Tuple[str, List[str]]]) -> str:
+        return "\n".join(line for _, body in parts for line in body)
+
+    compressed = render(sections)
+    if over_budget(compressed):
+        compressed = render([s for s in sections if s[0] not in LOW_VALUE_SECTIONS])
+    if over_budget(compressed):
+        cut = compressed[:token_budget * CHARS_PER_TOKEN]
+        compressed = cut.rsplit(None, 1)[0] + "\n[... remainder truncated]"
+
+    report = {'original_tokens': estimate_tokens(text or ""), 'compressed_tokens': estimate_tokens(compressed)}
+    report['tokens_saved'] = max(0, report['original_tokens'] - report['compressed_tokens'])
+    return compressed, report
@@ -0,0 +1,51 @@
+from resume_compression import PAGE_BREAK, compress_resume_text
+
+RESUME = PAGE_BREAK.join([
+    """Jane Doe
+jane.doe@example.com | +1 (555) 123-4567
+EXPERIENCE
+Senior Software Engineer
+Acme Corp
+2019 - 2022
+Responsibilities:
+Built data pipelines in Python and
+maintained the deployment tooling.
+Page 1 of 2""",
+    """Jane Doe
+Senior Software Engineer
+Globex
+2016
+Responsibilities:
+Led the migration to PostgreSQL.
+EDUCATION
+BSc Computer Science
+2012 - 2016
+2""",
+])
+
+def test_under_budget_keeps_dates_and_repeated_headings():
+    compressed, report = compress_resume_text(RESUME, token_budget=10_000)
+    lines = compressed.splitlines()
+    for year in ("2019 - 2022", "2016", "2012 - 2016"):
+        assert year in lines
+    assert lines.count("Senior Software Engineer") == 2
+    assert lines.count("Responsibilities:") == 2
+    assert "jane.doe@example.com | +1 (555) 123-4567" in lines
+    assert "Built data pipelines in Python and maintained the deployment tooling." in lines
+    assert report["original_tokens"] >= report["compressed_tokens"]
+
+def test_over_budget_drops_page_furniture_but_not_dates():
+    compressed, _ = compress_resume_text(RESUME, token_budget=80)
+    lines = compressed.splitlines()
+    assert "Page 1 of 2" not in lines
+    assert "2" not in lines
+    assert lines.count("Jane Doe") == 1
+    assert not any("@" in line for line in lines)
+    for year in ("2019 - 2022", "2016", "2012 - 2016"):
+        assert year in lines
+    assert lines.count("Senior Software Engineer") == 2
+
+def test_zero_budget_disables_lossy_steps():
+    compressed, _ = compress_resume_text(RESUME + "\nREFERENCES\nAvailable on request", token_budget=0)
+    assert "Page 1 of 2" in compressed.splitlines()
+    assert "Available on request" in compressed